@@ -1,25 +1,68 @@
 import os
+import asyncio
 import threading
-import sqlite3
+import time
 import requests
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urlencode
 
-from flask import Flask, render_template, request, redirect, session, send_file
+from flask import (
+    Flask, Response, render_template, request, redirect, session,
+    stream_template, stream_with_context,
+)
 from dotenv import load_dotenv
 
 import discord
 from discord.ext import commands
 
-import uuid
-from werkzeug.utils import secure_filename
+import db
+import migrations
+import export
+import images
+import metrics
+import pagecache
+import quota
+import stats
+import craft_stats
+import rentals
+import sessions
+from idempotency import idempotent, form_field as idempotency_field
+from ratelimit import rate_limited
+from lease import Lease
+from outbox import Outbox
+from members import MemberDirectory
+from roles import RoleIndex
+from discord_oauth import DiscordOAuth
+from guild_sync import GuildMirror
+from ingest import PhotoIngest
 
 
 # ── Load .env ──────────────────────────────────────────────────────────────────
 load_dotenv()
 app = Flask(__name__, static_folder="static")
 app.secret_key = os.getenv("SECRET_KEY")
+# сесії на сервері (sessions.db), у cookie — лише id (див. sessions.py)
+session_store = sessions.ServerSessionInterface(app.static_url_path)
+app.session_interface = session_store
+
+# фони: зменшені AVIF/WebP/JPEG-варіанти з хешем у назві (див. images.py)
+responsive = images.ResponsiveImages(app.static_folder, app.static_url_path)
+app.jinja_env.globals["responsive_bg"] = responsive.css
+# одноразовий ключ для кожної POST-форми (див. idempotency.py)
+app.jinja_env.globals["idempotency_field"] = idempotency_field
+app.jinja_env.filters["due_label"] = rentals.due_label
+
+@app.after_request
+def _cache_built_assets(resp):
+    # імена містять хеш вмісту — можна кешувати "назавжди"
+    if request.path.startswith(responsive.build_url + "/"):
+        resp.headers["Cache-Control"] = images.CACHE_FOREVER
+    return resp
+
+# сторінки: кеш рендеру за версіями даних + ETag/304; решта текстових відповідей — gzip/br
+page_cache = pagecache.PageCache(os.path.join(app.root_path, app.template_folder), app.static_folder)
+app.after_request(pagecache.compress)
 
 # ── ENV ────────────────────────────────────────────────────────────────────────
 BOT_TOKEN      = os.getenv("BOT_TOKEN")
@@ -30,6 +73,8 @@ CLIENT_ID     = os.getenv("DISCORD_CLIENT_ID")
 CLIENT_SECRET = os.getenv("DISCORD_CLIENT_SECRET")
 REDIRECT_URI  = os.getenv("DISCORD_REDIRECT_URI")
 
+oauth = DiscordOAuth(CLIENT_ID, CLIENT_SECRET, REDIRECT_URI)
+
 EXAM_LOG_CHANNEL_ID    = int(os.getenv("EXAM_LOG_CHANNEL_ID", LOG_CHANNEL_ID))
 SAI_LOG_CHANNEL_ID     = int(os.getenv("SAI_LOG_CHANNEL_ID", LOG_CHANNEL_ID))
 VEHICLE_LOG_CHANNEL_ID = int(os.getenv("VEHICLE_LOG_CHANNEL_ID", LOG_CHANNEL_ID))
@@ -39,6 +84,11 @@ ALLOWED_ROLES     = [r.strip() for r in os.getenv("ALLOWED_ROLES", "").split(","
 SAI_ALLOWED_ROLES = [r.strip() for r in os.getenv("SAI_ALLOWED_ROLES", "BCSD").split(",") if r.strip()]
 SA_LOG_CHANNEL_ID = int(os.getenv("SA_LOG_CHANNEL_ID", SAI_LOG_CHANNEL_ID))
 
+# all — Flask-потік + бот в одному процесі (як раніше);
+# web — лише WSGI-додаток (gunicorn), дані гільдії з дзеркала в audit.db;
+# bot — лише бот: гейтвей, дзеркало гільдії, доставка outbox
+RUN_MODE = os.getenv("RUN_MODE", "all")
+
 
 # ── Транспорт: ID = plate (щоб 1:1) ───────────────────────────────────────────
 VEHICLES = [
@@ -70,6 +120,122 @@ intents = discord.Intents.default()
 intents.members = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
+# черга і планувальник оренд працюють лише в одному процесі бота (див. lease.py)
+consumer_lease = Lease("discord-consumer")
+
+# усі логи в Discord — через чергу; Flask-потоки не чіпають loop бота напряму
+outbox = Outbox(bot, consumer_lease)
+
+# учасники гільдії: індекс, що живе з подій бота
+members_dir = MemberDirectory(GUILD_ID)
+
+# ролі гільдії + кеш рішень про доступ до аудиту
+role_index = RoleIndex(GUILD_ID, ALLOWED_ROLES)
+
+# дзеркало гільдії в audit.db для веб-воркерів у RUN_MODE=web
+guild_mirror = GuildMirror(GUILD_ID)
+
+# нагадування і позначка прострочених оренд транспорту (див. rentals.py)
+rental_scheduler = rentals.RentalScheduler(bot, outbox, VEHICLE_LOG_CHANNEL_ID, consumer_lease)
+
+# ── Метрики (/metrics) ────────────────────────────────────────────────────────
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+metrics_publisher = metrics.Publisher(RUN_MODE)
+# черга і гейтвей живуть у процесі бота — веб-воркер у RUN_MODE=web їх не звітує
+metrics.Gauge("bcsd_outbox_depth", "Undelivered outbox rows",
+              lambda: outbox.depth() if RUN_MODE != "web" else None)
+metrics.Gauge("bcsd_discord_gateway_latency_seconds", "Discord gateway heartbeat latency",
+              lambda: bot.latency if bot.is_ready() else None)
+
+@app.before_request
+def _metrics_begin():
+    metrics.begin_request()
+    if RUN_MODE == "web":
+        metrics_publisher.ensure_started()
+
+@app.after_request
+def _metrics_status(resp):
+    metrics.set_status(resp.status_code)
+    return resp
+
+@app.teardown_request
+def _metrics_end(exc):
+    # teardown — після того, як потокова відповідь (stream_template) віддана повністю
+    rule = request.url_rule
+    metrics.end_request(rule.rule if rule else "<unmatched>", request.method, exc is not None)
+
+@bot.event
+async def setup_hook():
+    consumer_lease.start()
+    outbox.start()
+    rental_scheduler.start()
+    if RUN_MODE == "bot":
+        metrics_publisher.ensure_started()
+
+@bot.event
+async def on_ready():
+    guild = bot.get_guild(GUILD_ID)
+    if guild:
+        members_dir.load(guild)
+        role_index.load(guild)
+        await asyncio.to_thread(guild_mirror.write_snapshot, guild)
+    # після (пере)підключення — дослати все, що не доставили
+    outbox.kick()
+
+@bot.event
+async def on_member_join(member):
+    members_dir.upsert(member)
+    await asyncio.to_thread(guild_mirror.upsert_member, member)
+
+@bot.event
+async def on_member_update(before, after):
+    members_dir.upsert(after)
+    if before.roles != after.roles:
+        role_index.forget(after.id)
+        # доступ відкликано — завершуємо сесії; інакше оновлюємо ролі в них
+        if role_index.has_access(after.id, [r.id for r in after.roles]):
+            await asyncio.to_thread(session_store.set_roles, after.id, [r.name for r in after.roles if not r.is_default()])
+        else:
+            await asyncio.to_thread(session_store.revoke_user, after.id)
+    await asyncio.to_thread(guild_mirror.upsert_member, after)
+
+@bot.event
+async def on_member_remove(member):
+    members_dir.remove(member)
+    role_index.forget(member.id)
+    await asyncio.to_thread(session_store.revoke_user, member.id)
+    await asyncio.to_thread(guild_mirror.remove_member, member)
+
+@bot.event
+async def on_guild_role_create(role):
+    role_index.upsert(role)
+    await asyncio.to_thread(guild_mirror.upsert_role, role)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    role_index.upsert(after)
+    await asyncio.to_thread(guild_mirror.upsert_role, after)
+
+@bot.event
+async def on_guild_role_delete(role):
+    role_index.remove(role)
+    await asyncio.to_thread(guild_mirror.remove_role, role)
+
+@bot.event
+async def on_user_update(before, after):
+    # глобальне ім'я змінює display_name у тих, хто без ніку
+    guild = bot.get_guild(GUILD_ID)
+    member = guild.get_member(after.id) if guild else None
+    if member:
+        members_dir.upsert(member)
+        await asyncio.to_thread(guild_mirror.upsert_member, member)
+
+if RUN_MODE == "web":
+    @app.before_request
+    def _sync_guild_mirror():
+        guild_mirror.refresh(members_dir, role_index)
+
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 def user_has_any_role(member, allowed_names):
@@ -78,22 +244,52 @@ def user_has_any_role(member, allowed_names):
     names = {r.name for r in member.roles if r and r.name}
     return any(n in names for n in allowed_names)
 
-def is_vehicle_taken(vehicle_id: str) -> bool:
-    with sqlite3.connect("audit.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT 1 FROM vehicle_rentals WHERE vehicle_id=? AND returned_at IS NULL LIMIT 1", (vehicle_id,))
-        return c.fetchone() is not None
-
-def my_active_rentals(discord_user_id: str):
-    with sqlite3.connect("audit.db") as conn:
-        c = conn.cursor()
-        c.execute("""
-            SELECT id, vehicle_id, plate, model, duration, reason, taken_at
+def fleet_availability(discord_user_id: str):
+    """Стан усього автопарку одним запитом: (вільні авто, мої активні бронювання)."""
+    with db.connect() as conn:
+        rows = conn.execute("""
+            SELECT id, vehicle_id, plate, model, duration, reason, taken_at, due_at, overdue_at, taken_by_id
             FROM vehicle_rentals
-            WHERE taken_by_id=? AND returned_at IS NULL
+            WHERE returned_at IS NULL
             ORDER BY taken_at DESC
-        """, (discord_user_id,))
-        return c.fetchall()
+        """).fetchall()
+
+    taken = {r[1] for r in rows}
+    available = [v for v in VEHICLES if v["id"] not in taken]
+    mine = [r[:9] for r in rows if r[9] == discord_user_id]
+    return available, mine
+
+def fleet_overview():
+    """Кожне авто зі статусом поточної оренди та завантаженістю за RENTAL_UTIL_DAYS днів."""
+    with db.connect() as conn:
+        open_rentals = {r[0]: r for r in conn.execute("""
+            SELECT vehicle_id, taken_by_id, taken_by_name, taken_at, due_at, overdue_at
+            FROM vehicle_rentals
+            WHERE returned_at IS NULL
+        """)}
+    hours = rentals.fleet_utilization(rentals.RENTAL_UTIL_DAYS)
+    window = rentals.RENTAL_UTIL_DAYS * 24
+
+    fleet = []
+    for v in VEHICLES:
+        r = open_rentals.get(v["id"])
+        fleet.append({
+            **v,
+            "status": "free" if not r else ("overdue" if r[5] else "taken"),
+            "holder_id": r[1] if r else None,
+            "holder_name": r[2] if r else None,
+            "taken_at": r[3] if r else None,
+            "due_at": r[4] if r else None,
+            "utilization": round(100 * min(hours.get(v["id"], 0.0), window) / window),
+        })
+    summary = {
+        "total": len(fleet),
+        "taken": sum(1 for f in fleet if f["status"] != "free"),
+        "overdue": sum(1 for f in fleet if f["status"] == "overdue"),
+        "utilization": round(sum(f["utilization"] for f in fleet) / len(fleet)) if fleet else 0,
+        "days": rentals.RENTAL_UTIL_DAYS,
+    }
+    return fleet, summary
 
 # ── Routes: базові ────────────────────────────────────────────────────────────
 @app.route("/")
@@ -124,54 +320,43 @@ def callback():
     if not str(next_page).startswith("/"):
         next_page = "/dashboard"
 
-    data = {
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "grant_type": "authorization_code",
-        "code": code,
-        "redirect_uri": REDIRECT_URI,
-    }
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    r = requests.post("https://discord.com/api/oauth2/token", data=data, headers=headers)
-    if not r.ok:
-        return f"❌ Помилка токену: {r.status_code} {r.text}"
+    try:
+        r = oauth.exchange_code(code)
+        if not r.ok:
+            return f"❌ Помилка токену: {r.status_code} {r.text}"
 
-    access_token = r.json()["access_token"]
+        access_token = r.json()["access_token"]
+        me, gm = oauth.fetch_identity(access_token, GUILD_ID)
+    except requests.RequestException:
+        return "❌ Discord не відповідає, спробуйте ще раз.", 504
 
-    user_info = requests.get(
-        "https://discord.com/api/users/@me",
-        headers={"Authorization": f"Bearer {access_token}"}
-    ).json()
+    if not me.ok:
+        return f"❌ Помилка профілю: {me.status_code}"
+    user_info = me.json()
 
-    gm = requests.get(
-        f"https://discord.com/api/users/@me/guilds/{GUILD_ID}/member",
-        headers={"Authorization": f"Bearer {access_token}"}
-    )
     if gm.status_code != 200:
         return "❌ Ви не є учасником сервера."
 
     roles = gm.json().get("roles", [])
-    guild = discord.utils.get(bot.guilds, id=GUILD_ID)
-    if not guild:
+    if not role_index.ready:
         return "❌ Бот не підключений до сервера або не має доступу."
 
-    for r_id in roles:
-        role = discord.utils.get(guild.roles, id=int(r_id))
-        if role and role.name in ALLOWED_ROLES:
-            session["user"] = user_info
-            return redirect(next_page)
+    if role_index.has_access(user_info["id"], roles):
+        session["user"] = user_info
+        session["roles"] = [name for name in map(role_index.name_of, roles) if name]
+        return redirect(next_page)
 
     return "❌ У вас немає доступу до кадрового аудиту."
 
 # ── Кадровий аудит ────────────────────────────────────────────────────────────
 @app.route("/dashboard", methods=["GET", "POST"])
+@rate_limited
+@idempotent
 def dashboard():
     if "user" not in session:
         return redirect("/")
-    guild = discord.utils.get(bot.guilds, id=GUILD_ID)
-    if not guild:
+    if not members_dir.ready:
         return "❌ Бот не бачить сервер."
-    members = [(m.display_name, m.id) for m in guild.members if not m.bot]
 
     if request.method == "POST":
         executor    = session["user"]["username"]
@@ -182,7 +367,7 @@ def dashboard():
         new_role    = request.form.get("role_name", "").strip()
         reason      = request.form.get("reason", "Без причини")
 
-        member = discord.utils.get(guild.members, id=int(target_id)) if target_id.isdigit() else None
+        member = members_dir.get(target_id) if target_id.isdigit() else None
         mention = member.mention if member else f"`{target_id}`"
         target_name = member.display_name if member else target_id
 
@@ -202,11 +387,7 @@ def dashboard():
         )
         embed.set_footer(text="BCSD • Кадровий аудит")
 
-        ch = bot.get_channel(LOG_CHANNEL_ID)
-        if ch:
-            bot.loop.create_task(ch.send(embed=embed))
-
-        with sqlite3.connect("audit.db") as conn:
+        with db.connect() as conn:
             c = conn.cursor()
             c.execute("""
                 INSERT INTO actions (executor, target, action, role, reason, date)
@@ -219,49 +400,240 @@ def dashboard():
                 reason,
                 datetime.now(ZoneInfo("Europe/Kyiv")).strftime("%Y-%m-%d %H:%M:%S")
             ))
+            outbox.send(LOG_CHANNEL_ID, embed, conn)
             conn.commit()
 
         return redirect("/dashboard")
 
-    return render_template("dashboard.html", members=members)
+    return page_cache.respond((), lambda: render_template("dashboard.html"))
+
+@app.route("/api/members")
+def api_members():
+    if "user" not in session:
+        return {"error": "unauthorized"}, 401
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    found = members_dir.search(request.args.get("q", ""), limit)
+    # формат відповіді — як чекає select2 (id як рядок: JS не тримає 64-бітні int)
+    return {"results": [{"id": str(mid), "text": name} for name, mid in found]}
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 100))
+
+# фільтри пошуку: параметр запиту → колонка actions (точний збіг)
+ACTION_FILTERS = {"executor": "executor", "target": "target", "action": "action", "role": "role"}
+
+def _fts_query(text: str) -> str:
+    # кожне слово — префіксний терм у лапках, щоб ввід користувача не ламав синтаксис FTS5
+    terms = ['"' + t.replace('"', '""') + '"*' for t in text.split()]
+    return " ".join(terms)
+
+def keyset_page(table: str, columns: str, col: str, where: list, params: list, args, limit: int, before: str):
+    """Спільний keyset-пошук: фільтр date_from/date_to по col, сторінка по (col, id) спадно.
+
+    columns має починатися з id; col додається останньою колонкою рядка.
+    Повертає (рядки, курсор наступної сторінки) — курсор {before: col, "before_id": id}.
+    """
+    where, params = list(where), list(params)
+    date_from = (args.get("date_from") or "").strip()
+    date_to   = (args.get("date_to") or "").strip()
+    if date_from:
+        where.append(f"{col} >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append(f"{col} < date(?, '+1 day')")
+        params.append(date_to)
+
+    # курсор — останній рядок попередньої сторінки
+    before_val = args.get(before)
+    before_id  = args.get("before_id", type=int)
+    if before_val and before_id is not None:
+        where.append(f"({col}, id) < (?, ?)")
+        params += [before_val, before_id]
+
+    sql_where = ("WHERE " + " AND ".join(where)) if where else ""
+    with db.connect() as conn:
+        rows = conn.execute(f"""
+            SELECT {columns}, {col}
+            FROM {table}
+            {sql_where}
+            ORDER BY {col} DESC, id DESC
+            LIMIT ?
+        """, (*params, limit + 1)).fetchall()
+
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = {before: rows[-1][-1], "before_id": rows[-1][0]}
+    return rows, cursor
+
+def keyset_view(path: str, template: str, search, filter_keys, rows_name: str, **context):
+    """Потоковий рендер сторінки списку з keyset-пагінацією (/history, /reports)."""
+    rows, cursor = search(request.args, HISTORY_PAGE_SIZE)
+    filters = {k: request.args[k] for k in filter_keys if request.args.get(k)}
+
+    next_url = None
+    if cursor:
+        next_url = f"{path}?" + urlencode({**filters, **cursor})
+
+    return stream_with_context(stream_template(
+        template,
+        **{rows_name: rows},
+        **context,
+        filters=filters,
+        next_url=next_url,
+        first_url=f"{path}?" + urlencode(filters),
+        is_first_page="before_id" not in request.args,
+    ))
+
+def search_actions(args, limit: int):
+    """Фільтрований keyset-пошук по actions. Повертає (рядки, курсор наступної сторінки)."""
+    where, params = [], []
+    for arg, col in ACTION_FILTERS.items():
+        val = (args.get(arg) or "").strip()
+        if val:
+            where.append(f"{col} = ?")
+            params.append(val)
+
+    q = (args.get("q") or "").strip()
+    if q:
+        where.append("id IN (SELECT rowid FROM actions_fts WHERE actions_fts MATCH ?)")
+        params.append(_fts_query(q))
+
+    return keyset_page(
+        "actions",
+        "id, executor, target, action, role, reason, COALESCE(strftime('%d.%m.%Y', date), date)",
+        "date", where, params, args, limit, before="before_date",
+    )
+
+HISTORY_FILTERS = (*ACTION_FILTERS, "date_from", "date_to", "q")
 
 @app.route("/history")
 def history():
-    with sqlite3.connect("audit.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT * FROM actions ORDER BY date DESC")
-        rows = c.fetchall()
-
-    actions = []
-    for r in rows:
-        try:
-            d = datetime.strptime(r[6], "%Y-%m-%d %H:%M:%S").strftime("%d.%m.%Y")
-        except Exception:
-            d = r[6]
-        actions.append((r[0], r[1], r[2], r[3], r[4], r[5], d))
+    if "user" not in session:
+        return redirect("/login?next=/history")
+    def render():
+        return keyset_view("/history", "history.html", search_actions, HISTORY_FILTERS, "actions")
+    return page_cache.respond(("actions",), render)
 
-    return render_template("history.html", actions=actions)
+@app.route("/api/actions")
+def api_actions():
+    if "user" not in session:
+        return {"error": "unauthorized"}, 401
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+    rows, cursor = search_actions(request.args, limit)
+    return {
+        "items": [
+            {"id": r[0], "executor": r[1], "target": r[2], "action": r[3],
+             "role": r[4], "reason": r[5], "date": r[7]}
+            for r in rows
+        ],
+        "next": cursor,
+    }
 
 @app.route("/download_db")
 def download_db():
-    return send_file("audit.db", as_attachment=True)
+    if "user" not in session:
+        return redirect("/login?next=/download_db")
+    # онлайн-знімок через backup API, а не живий файл (може бути "порваним" посеред запису)
+    name = f"audit-{datetime.now(ZoneInfo('Europe/Kyiv')):%Y%m%d-%H%M}.db.gz"
+    return Response(export.snapshot_gzip(), mimetype="application/gzip",
+                    headers={"Content-Disposition": f"attachment; filename={name}"})
+
+@app.route("/export/<table>.<fmt>")
+def export_table(table, fmt):
+    if "user" not in session:
+        return redirect(f"/login?next=/export/{table}.{fmt}")
+    try:
+        stream = export.table_stream(table, fmt)
+    except KeyError:
+        return "❌ Невідома таблиця або формат.", 404
+    return Response(stream, mimetype=export.EXPORT_FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={table}.{fmt}"})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return "unauthorized", 401
+    others = metrics_publisher.others() if RUN_MODE != "all" else ()
+    return Response(metrics.render(metrics_publisher.proc, others), content_type=metrics.CONTENT_TYPE)
 
 @app.route("/logout")
 def logout():
     session.clear()
     return redirect("/")
 
+# ── Звіти на підвищення (SAI / SA / SPD): збереження та історія ──────────────
+PROMOTION_DEPARTMENTS = ("SAI", "SA", "SPD")
+
+def store_promotion_report(conn, department, author_id, author_name, rank_from, rank_to, report, channel_id, embed):
+    # виконується в пакетній транзакції db.write(): звіт і лог у Discord — атомарно
+    conn.execute("""
+        INSERT INTO promotion_reports
+            (department, author_id, author_name, rank_from, rank_to, report, submitted_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (
+        department, author_id, author_name, rank_from, rank_to, report,
+        datetime.now(ZoneInfo("Europe/Kyiv")).strftime("%Y-%m-%d %H:%M:%S"),
+    ))
+    outbox.send(channel_id, embed, conn)
+
+def search_promotion_reports(args, limit: int):
+    """Фільтрований keyset-пошук по promotion_reports. Повертає (рядки, курсор наступної сторінки)."""
+    where, params = [], []
+    department = (args.get("department") or "").strip().upper()
+    if department in PROMOTION_DEPARTMENTS:
+        where.append("department = ?")
+        params.append(department)
+
+    author = (args.get("author") or "").strip()
+    if author:
+        where.append("author_id = ?" if author.isdigit() else "author_name = ?")
+        params.append(author)
+
+    return keyset_page(
+        "promotion_reports",
+        "id, department, author_id, author_name, rank_from, rank_to, report,"
+        " strftime('%d.%m.%Y %H:%M', submitted_at)",
+        "submitted_at", where, params, args, limit, before="before_at",
+    )
+
+REPORT_FILTERS = ("department", "author", "date_from", "date_to")
+
+@app.route("/reports")
+def promotion_reports():
+    if "user" not in session:
+        return redirect("/login?next=/reports")
+    def render():
+        return keyset_view("/reports", "reports.html", search_promotion_reports, REPORT_FILTERS, "reports",
+                           departments=PROMOTION_DEPARTMENTS)
+    return page_cache.respond(("promotion_reports",), render)
+
+@app.route("/stats")
+def stats_page():
+    if "user" not in session:
+        return redirect("/login?next=/stats")
+    days = request.args.get("days", 30, type=int)
+    if days not in stats.STATS_PERIODS:
+        days = 30
+    def render():
+        return render_template("stats.html", s=stats.overview(days), kinds=stats.KINDS, periods=stats.STATS_PERIODS)
+    # межа періоду зсувається опівночі — день у ключі
+    return page_cache.respond(
+        ("actions", "vehicle_rentals", "exam_requests", "craft_reports"), render,
+        extra=(stats.since_day(days),),
+    )
+
 # ── SAI: звіт на підвищення ───────────────────────────────────────────────────
 @app.route("/sai", methods=["GET", "POST"])
+@rate_limited
+@idempotent
 def sai_report():
     if "user" not in session:
         return redirect("/login?next=/sai")
 
-    guild = discord.utils.get(bot.guilds, id=GUILD_ID)
-    if not guild:
+    if not members_dir.ready:
         return "❌ Бот не бачить сервер."
 
-    member = discord.utils.get(guild.members, id=int(session["user"]["id"]))
+    member = members_dir.get(session["user"]["id"])
     # За потреби — поверни перевірку на ролі:
     # if not user_has_any_role(member, SAI_ALLOWED_ROLES):
     #     need = ", ".join(SAI_ALLOWED_ROLES)
@@ -292,24 +664,37 @@ def sai_report():
         )
         embed.set_footer(text="BCSD • SAI")
 
-        ch = bot.get_channel(SAI_LOG_CHANNEL_ID)
-        if ch:
-            bot.loop.create_task(ch.send(embed=embed))
+        db.write(lambda conn: store_promotion_report(
+            conn, "SAI", author_id, author_name, rank_from, rank_to, work_report, SAI_LOG_CHANNEL_ID, embed
+        ))
 
         return redirect("/sai?ok=1")
 
-    return render_template("sai_report.html")
+    return page_cache.respond((), lambda: render_template("sai_report.html"))
 
 # ── VEHICLES: вільні картки + взяти/повернути ────────────────────────────────
 @app.route("/vehicles")
 def vehicles():
     if "user" not in session:
         return redirect("/login?next=/vehicles")
-    available = [v for v in VEHICLES if not is_vehicle_taken(v["id"])]
-    mine = my_active_rentals(session["user"]["id"])
-    return render_template("vehicles.html", vehicles=available, my_rentals=mine)
+    def render():
+        available, mine = fleet_availability(session["user"]["id"])
+        return render_template("vehicles.html", vehicles=available, my_rentals=mine)
+    return page_cache.respond(("vehicle_rentals",), render)
+
+@app.route("/vehicles/fleet")
+def vehicles_fleet():
+    if "user" not in session:
+        return redirect("/login?next=/vehicles/fleet")
+    def render():
+        fleet, summary = fleet_overview()
+        return render_template("vehicles_fleet.html", fleet=fleet, summary=summary)
+    # завантаженість залежить і від часу — ключ оновлюється щохвилини
+    return page_cache.respond(("vehicle_rentals",), render, extra=(int(time.time() // 60),))
 
 @app.route("/vehicles/take", methods=["POST"])
+@rate_limited
+@idempotent
 def vehicles_take():
     if "user" not in session:
         return redirect("/login?next=/vehicles")
@@ -323,20 +708,11 @@ def vehicles_take():
         return "❌ Невідомий транспорт.", 400
     if not duration or not reason:
         return "❌ Вкажіть тривалість і причину.", 400
-    if is_vehicle_taken(vehicle_id):
-        return "❌ Цей транспорт уже взяли.", 400
 
     user = session["user"]
-    now_str = datetime.now(ZoneInfo("Europe/Kyiv")).strftime("%Y-%m-%d %H:%M:%S")
-
-    with sqlite3.connect("audit.db") as conn:
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO vehicle_rentals
-            (vehicle_id, plate, model, taken_by_id, taken_by_name, duration, reason, taken_at, returned_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)
-        """, (v["id"], v["plate"], v["name"], user["id"], user.get("username","Unknown"), duration, reason, now_str))
-        conn.commit()
+    now = rentals.now_kyiv()
+    now_str = now.strftime(rentals.TS_FORMAT)
+    due_at, remind_at = rentals.schedule(now, duration)
 
     # Embed у лог-канал
     embed = discord.Embed(
@@ -346,7 +722,7 @@ def vehicles_take():
             f"👤 **Хто взяв:** <@{user['id']}> (`{user.get('username','Unknown')}`)\n"
             f"🪪 **Номера транспорту:** `{v['plate']}`\n"
             f"🚘 **Модель:** {v['name']}\n"
-            f"⏳ **На час:** {duration}\n"
+            f"⏳ **На час:** {duration} (до `{rentals.due_label(due_at)}`)\n"
             f"📝 **Причина:** {reason}\n"
             f"🕒 **Дата:** `{datetime.now(ZoneInfo('Europe/Kyiv')):%d.%m.%Y %H:%M}`\n"
             "━━━━━━━━━━━━━━━━━━━"
@@ -354,13 +730,26 @@ def vehicles_take():
         color=discord.Color.gold()
     )
     embed.set_footer(text="BCSD • Vehicle Request")
-    ch = bot.get_channel(VEHICLE_LOG_CHANNEL_ID)
-    if ch:
-        bot.loop.create_task(ch.send(embed=embed))
+
+    with db.connect() as conn:
+        # одна умовна вставка: унікальний частковий індекс idx_rentals_open_vehicle
+        # не дає двом одночасним запитам відкрити оренду того самого авто
+        inserted = conn.execute("""
+            INSERT OR IGNORE INTO vehicle_rentals
+            (vehicle_id, plate, model, taken_by_id, taken_by_name, duration, reason, taken_at, returned_at, due_at, remind_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?)
+        """, (v["id"], v["plate"], v["name"], user["id"], user.get("username","Unknown"), duration, reason, now_str,
+              due_at, remind_at)).rowcount
+        if not inserted:
+            return "❌ Цей транспорт уже взяли.", 400
+        outbox.send(VEHICLE_LOG_CHANNEL_ID, embed, conn)
+    rental_scheduler.kick()
 
     return redirect("/vehicles?ok=1")
 
 @app.route("/vehicles/return", methods=["POST"])
+@rate_limited
+@idempotent
 def vehicles_return():
     if "user" not in session:
         return redirect("/login?next=/vehicles")
@@ -369,43 +758,40 @@ def vehicles_return():
     if not rental_id:
         return redirect("/vehicles?err=no_id")
 
-    with sqlite3.connect("audit.db") as conn:
-        c = conn.cursor()
-        c.execute("""
-            SELECT id, vehicle_id, plate, model
-            FROM vehicle_rentals
+    now_str = datetime.now(ZoneInfo("Europe/Kyiv")).strftime("%Y-%m-%d %H:%M:%S")
+    with db.connect() as conn:
+        # закриття — теж одним умовним записом: повторне повернення нічого не змінить
+        row = conn.execute("""
+            UPDATE vehicle_rentals SET returned_at=?
             WHERE id=? AND taken_by_id=? AND returned_at IS NULL
-        """, (rental_id, session["user"]["id"]))
-        row = c.fetchone()
+            RETURNING id, vehicle_id, plate, model
+        """, (now_str, rental_id, session["user"]["id"])).fetchone()
 
         if not row:
             return redirect("/vehicles?err=not_found")
 
-        now_str = datetime.now(ZoneInfo("Europe/Kyiv")).strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("UPDATE vehicle_rentals SET returned_at=? WHERE id=?", (now_str, rental_id))
+        embed = discord.Embed(
+            title="✅ Повернення транспорту",
+            description=(
+                "━━━━━━━━━━━━━━━━━━━\n"
+                f"👤 **Хто повернув:** <@{session['user']['id']}>\n"
+                f"🪪 **Номера:** `{row[2]}`\n"
+                f"🚘 **Модель:** {row[3]}\n"
+                f"🕒 **Час:** `{datetime.now(ZoneInfo('Europe/Kyiv')):%d.%m.%Y %H:%M}`\n"
+                "━━━━━━━━━━━━━━━━━━━"
+            ),
+            color=discord.Color.green()
+        )
+        embed.set_footer(text="BCSD • Vehicle Return")
+        outbox.send(VEHICLE_LOG_CHANNEL_ID, embed, conn)
         conn.commit()
 
-    embed = discord.Embed(
-        title="✅ Повернення транспорту",
-        description=(
-            "━━━━━━━━━━━━━━━━━━━\n"
-            f"👤 **Хто повернув:** <@{session['user']['id']}>\n"
-            f"🪪 **Номера:** `{row[2]}`\n"
-            f"🚘 **Модель:** {row[3]}\n"
-            f"🕒 **Час:** `{datetime.now(ZoneInfo('Europe/Kyiv')):%d.%m.%Y %H:%M}`\n"
-            "━━━━━━━━━━━━━━━━━━━"
-        ),
-        color=discord.Color.green()
-    )
-    embed.set_footer(text="BCSD • Vehicle Return")
-    ch = bot.get_channel(VEHICLE_LOG_CHANNEL_ID)
-    if ch:
-        bot.loop.create_task(ch.send(embed=embed))
-
     return redirect("/vehicles?returned=1")
 
 # ── Запит: іспит / присяга / лекція ──────────────────────────────────────────
 @app.route("/exam_request", methods=["GET", "POST"])
+@rate_limited
+@idempotent
 def exam_request():
     if "user" not in session:
         return redirect("/login?next=/exam_request")
@@ -422,14 +808,6 @@ def exam_request():
         now = datetime.now(ZoneInfo("Europe/Kyiv"))
         now_str = now.strftime("%Y-%m-%d %H:%M:%S")
 
-        with sqlite3.connect("audit.db") as conn:
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO exam_requests (author_name, author_id, action_type, submitted_at)
-                VALUES (?, ?, ?, ?)
-            """, (author_name, author_id, action_type, now_str))
-            conn.commit()
-
         embed = discord.Embed(
             title="📨 Запит на іспит / присягу / лекцію",
             description=(
@@ -443,20 +821,26 @@ def exam_request():
         )
         embed.set_footer(text="BCSD • Exam/Oath/Lecture Request")
 
-        ch = bot.get_channel(EXAM_LOG_CHANNEL_ID)
-        if ch:
-            bot.loop.create_task(ch.send(embed=embed))
+        with db.connect() as conn:
+            c = conn.cursor()
+            c.execute("""
+                INSERT INTO exam_requests (author_name, author_id, action_type, submitted_at)
+                VALUES (?, ?, ?, ?)
+            """, (author_name, author_id, action_type, now_str))
+            outbox.send(EXAM_LOG_CHANNEL_ID, embed, conn)
+            conn.commit()
 
         return redirect("/exam_request?ok=1")
 
-    return render_template("exam_request.html")
+    return page_cache.respond((), lambda: render_template("exam_request.html"))
 @app.route("/sa", methods=["GET", "POST"])
+@rate_limited
+@idempotent
 def sa_report():
     if "user" not in session:
         return redirect("/login?next=/sa")
 
-    guild = discord.utils.get(bot.guilds, id=GUILD_ID)
-    if not guild:
+    if not members_dir.ready:
         return "❌ Бот не бачить сервер."
 
     if request.method == "POST":
@@ -484,17 +868,15 @@ def sa_report():
         )
         embed.set_footer(text="BCSD • SA")
 
-        ch = bot.get_channel(SA_LOG_CHANNEL_ID)
-        if ch:
-            bot.loop.create_task(ch.send(embed=embed))
+        db.write(lambda conn: store_promotion_report(
+            conn, "SA", author_id, author_name, rank_from, rank_to, work_report, SA_LOG_CHANNEL_ID, embed
+        ))
 
         return redirect("/sa?ok=1")
 
-    return render_template("sa_report.html")
+    return page_cache.respond((), lambda: render_template("sa_report.html"))
 # ENV:
 # ── Craft: імпорти ────────────────────────────────────────────────────────────
-import uuid
-from werkzeug.utils import secure_filename
 from flask import send_from_directory, url_for
 
 # ── CRAFT ENV / CONFIG ────────────────────────────────────────────────────────
@@ -508,6 +890,8 @@ app.config["MAX_CONTENT_LENGTH"] = 25 * 1024 * 1024
 UPLOAD_DIR = os.path.join(app.static_folder, "craft_uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+photo_ingest = PhotoIngest(UPLOAD_DIR, "/static/craft_uploads", outbox)
+
 ALLOWED_EXTS = {"png", "jpg", "jpeg", "webp"}
 
 def _allowed_file(filename: str) -> bool:
@@ -518,7 +902,7 @@ def _allowed_file(filename: str) -> bool:
 
 # ── DB: init (єдина версія, без дублів!) ─────────────────────────────────────
 def init_db():
-    with sqlite3.connect("audit.db") as conn:
+    with db.connect() as conn:
         c = conn.cursor()
 
         # кадровий аудит
@@ -584,6 +968,11 @@ def init_db():
 
         conn.commit()
 
+    # індекси та подальші зміни схеми — версійовані міграції
+    migrations.run_migrations()
+    # не лишати відкритих з'єднань у пулі: gunicorn форкає воркери після імпорту
+    db.close_all()
+
 # ВАЖЛИВО: викликати лише ОДИН раз у всьому файлі
 init_db()
 
@@ -598,10 +987,12 @@ GUNSMITH_LEVELS = {
 }
 
 # Ліміт за роллю: Senior Staff → 900, інакше → 500
-def craft_role_cap(member):
-    if not member:
-        return 500
-    names = {r.name for r in member.roles if r and r.name}
+def craft_role_cap(user_id):
+    # назви ролей кешовані в сесії при вході й оновлюються з on_member_update (set_roles)
+    names = session.get("roles")
+    if names is None:  # сесія без кешу ролей — з довідника учасників
+        member = members_dir.get(user_id)
+        names = [r.name for r in member.roles if r and r.name] if member else ()
     return 900 if SENIOR_ROLE_NAME in names else 500
 
 # Каталог предметів
@@ -659,13 +1050,13 @@ def compute_craft_cost(items_qty: dict, level: int):
 
 # ── ROUTE: /craft ─────────────────────────────────────────────────────────────
 @app.route("/craft", methods=["GET", "POST"])
+@rate_limited
+@idempotent
 def craft_report():
     if "user" not in session:
         return redirect("/login?next=/craft")
 
-    guild  = discord.utils.get(bot.guilds, id=GUILD_ID)
-    member = discord.utils.get(guild.members, id=int(session["user"]["id"])) if guild else None
-    role_cap = craft_role_cap(member)  # 900 або 500
+    role_cap = craft_role_cap(session["user"]["id"])  # 900 або 500
 
     if request.method == "POST":
         author_id   = session["user"]["id"]
@@ -696,17 +1087,31 @@ def craft_report():
         # підрахунок
         total_cost, discount_pct, breakdown = compute_craft_cost(items_qty, level)
 
-        # ліміт
-        if total_cost > role_cap:
-            return f"❌ Перевищено ліміт матеріалів: {total_cost} > {role_cap}. Скоротіть кількість.", 400
-
         # час
         now = datetime.now(ZoneInfo("Europe/Kyiv"))
         now_str = now.strftime("%Y-%m-%d %H:%M:%S")
+        day = quota.day_key(now)
+
+        # ліміт — на день, з урахуванням уже поданих сьогодні звітів
+        # (швидка відмова до завантаження фото; остаточна перевірка — в транзакції нижче)
+        left = role_cap - quota.used(author_id, day)
+        if total_cost > left:
+            return f"❌ Перевищено денний ліміт матеріалів: {total_cost} > {left:g} (ліміт {role_cap}). Скоротіть кількість.", 400
+
+        # ФОТО: лише потоково у тимчасові файли — поза транзакцією БД;
+        # перевірка, стиснення і прикріплення до логу — у фоні (ingest.py)
+        uploads = [f for f in request.files.getlist("photos") if f and _allowed_file(f.filename)]
+        staged = photo_ingest.stage(uploads)
 
         # збереження в БД
         import json
-        with sqlite3.connect("audit.db") as conn:
+        with db.connect() as conn:
+            # умовне списання з денного ліміту: паралельні звіти не проскочать разом
+            used = quota.charge(conn, author_id, day, total_cost, role_cap)
+            if used is None:
+                photo_ingest.discard(staged)
+                return f"❌ Перевищено денний ліміт матеріалів ({role_cap}). Скоротіть кількість.", 400
+
             c = conn.cursor()
             c.execute("""
                 INSERT INTO craft_reports
@@ -717,101 +1122,95 @@ def craft_report():
                 json.dumps(breakdown, ensure_ascii=False), purpose, now_str
             ))
             craft_id = c.lastrowid
+            craft_stats.store_items(conn, craft_id, author_id, now_str, breakdown)
 
-            # ФОТО: збереження у файлову систему + відносні шляхи у БД
-            files = request.files.getlist("photos")
-            saved_paths = []
-            for f in files:
-                if not f or not f.filename:
-                    continue
-                if not _allowed_file(f.filename):
-                    continue
-                safe_name = secure_filename(f.filename)
-                # унікальна назва
-                unique = f"{uuid.uuid4().hex}_{safe_name}"
-                abs_path = os.path.join(UPLOAD_DIR, unique)
-                rel_path = f"/static/craft_uploads/{unique}"
-                f.save(abs_path)
-                saved_paths.append(rel_path)
-                c.execute("""
-                    INSERT INTO craft_photos (craft_report_id, file_path)
-                    VALUES (?, ?)
-                """, (craft_id, rel_path))
+            # ембед у Discord (що і скільки штук)
+            # НОВЕ: ім’я, яке користувач впише у формі (fallback — username із Discord)
+            display_name = (request.form.get("display_name") or "").strip()
+            if not display_name:
+                display_name = author_name
 
-            conn.commit()
+            # формування рядків номенклатури
+            lines = []
+            for item in breakdown:
+                lines.append(f"- {item['label']}: **{item['qty']} шт** × {item['unit_cost']} = {item['cost']}")
 
-        # ембед у Discord (що і скільки штук)
-      # ... усередині craft_report(), у гілці if request.method == "POST": ...
-
-        author_id   = session["user"]["id"]
-        author_name = session["user"].get("username", "Unknown")
-
-        # НОВЕ: ім’я, яке користувач впише у формі (fallback — username із Discord)
-        display_name = (request.form.get("display_name") or "").strip()
-        if not display_name:
-            display_name = author_name
-
-        # ... решта твого коду без змін (рівень/мета/обчислення/БД) ...
+            # НОВЕ: у дужках підставляємо саме display_name
+            desc = (
+                "━━━━━━━━━━━━━━━━━━━\n"
+                f"🧑‍🏭 **Хто крафтить:** <@{author_id}> (`{display_name}`)\n"
+                f"🛠️ **Рівень зброяра:** {level} (знижка на зброю: {discount_pct}%)\n"
+                f"📦 **Ліміт за роллю:** {role_cap} матеріалів/день (залишок: {role_cap - used:g})\n"
+                f"🎯 **Мета:** {purpose}\n"
+                f"🧾 **Сума:** {total_cost} матеріалів\n"
+                f"📄 **Номенклатура:**\n" + ("\n".join(lines) if lines else "—") + "\n"
+                f"🕒 **Дата:** `{now:%d.%m.%Y %H:%M}`\n"
+                "━━━━━━━━━━━━━━━━━━━"
+            )
+            if not staged:
+                desc += "\n_Нагадування: прошу прикріпити фото докази до повідомлення._"
+
+            embed = discord.Embed(
+                title="🧰 Звіт крафту",
+                description=desc,
+                color=discord.Color.teal()
+            )
+            embed.set_footer(text="BCSD • Craft Report")
+
+            # лог іде в ту ж транзакцію, що й звіт; з фото — чекає, поки їх оброблять
+            outbox_id = outbox.send(CRAFT_LOG_CHANNEL_ID, embed, conn, held=bool(staged))
+            conn.commit()
 
-        # формування рядків номенклатури
-        lines = []
-        for item in breakdown:
-            lines.append(f"- {item['label']}: **{item['qty']} шт** × {item['unit_cost']} = {item['cost']}")
+        if staged:
+            photo_ingest.submit(craft_id, outbox_id, embed, staged)
 
-        # НОВЕ: у дужках підставляємо саме display_name
-        desc = (
-            "━━━━━━━━━━━━━━━━━━━\n"
-            f"🧑‍🏭 **Хто крафтить:** <@{author_id}> (`{display_name}`)\n"
-            f"🛠️ **Рівень зброяра:** {level} (знижка на зброю: {discount_pct}%)\n"
-            f"📦 **Ліміт за роллю:** {role_cap} матеріалів\n"
-            f"🎯 **Мета:** {purpose}\n"
-            f"🧾 **Сума:** {total_cost} матеріалів\n"
-            f"📄 **Номенклатура:**\n" + ("\n".join(lines) if lines else "—") + "\n"
-            f"🕒 **Дата:** `{now:%d.%m.%Y %H:%M}`\n"
-            "━━━━━━━━━━━━━━━━━━━\n"
-            "_Нагадування: прошу прикріпити фото докази до повідомлення._"
-        )
+        return redirect("/craft?ok=1")
 
-        embed = discord.Embed(
-            title="🧰 Звіт крафту",
-            description=desc,
-            color=discord.Color.teal()
+    # GET
+    day = quota.day_key()
+    def render():
+        used_today = quota.used(session["user"]["id"], day)
+        return render_template(
+            "craft_report.html",
+            catalog=CRAFT_ITEMS,
+            role_cap=role_cap,
+            quota_used=used_today,
+            quota_left=max(role_cap - used_today, 0),
+            levels=GUNSMITH_LEVELS
         )
-        embed.set_footer(text="BCSD • Craft Report")
-
+    return page_cache.respond(("craft_reports",), render, extra=(role_cap, day))
 
-        # якщо є фото — додамо перше як прев'ю (Discord дозволяє одне зображення в Embed)
-        # решту можна прикріпити як окремі повідомлення, якщо дуже треба
-        if 'saved_paths' in locals() and saved_paths:
-            embed.set_image(url=saved_paths[0])
-
-        ch = bot.get_channel(CRAFT_LOG_CHANNEL_ID)
-        if ch:
-            bot.loop.create_task(ch.send(embed=embed))
-            # якщо хочеш докинути решту фото окремими повідомленнями:
-            # for p in saved_paths[1:]:
-            #     bot.loop.create_task(ch.send(p))
-
-        return redirect("/craft?ok=1")
+@app.route("/api/craft/consumption")
+def api_craft_consumption():
+    # /api/craft/consumption?by=member&item=heavy_rifle_556&date_from=2025-01-06&date_to=2025-01-12
+    if "user" not in session:
+        return {"error": "unauthorized"}, 401
+    group = request.args.get("by", "item")
+    if group not in craft_stats.CONSUMPTION_GROUPS:
+        return {"error": f"by: одне з {', '.join(craft_stats.CONSUMPTION_GROUPS)}"}, 400
+    rows = craft_stats.consumption(request.args, group)
+    items = []
+    for key, author_name, qty, cost, reports in rows:
+        entry = {"key": key, "qty": qty, "cost": cost, "reports": reports}
+        if group == "item":
+            entry["label"] = CRAFT_ITEMS.get(key, {}).get("label", key)
+        elif group == "member":
+            entry["author_name"] = author_name
+        items.append(entry)
+    return {"by": group, "items": items}
 
-    # GET
-    return render_template(
-        "craft_report.html",
-        catalog=CRAFT_ITEMS,
-        role_cap=role_cap,
-        levels=GUNSMITH_LEVELS
-    )
     # ── SPD: звіт на підвищення ───────────────────────────────────────────────────
 @app.route("/spd", methods=["GET", "POST"])
+@rate_limited
+@idempotent
 def spd_report():
     if "user" not in session:
         return redirect("/login?next=/spd")
 
-    guild = discord.utils.get(bot.guilds, id=GUILD_ID)
-    if not guild:
+    if not members_dir.ready:
         return "❌ Бот не бачить сервер."
 
-    member = discord.utils.get(guild.members, id=int(session["user"]["id"]))
+    member = members_dir.get(session["user"]["id"])
     # За потреби — поверни перевірку на ролі:
     # if not user_has_any_role(member, SAI_ALLOWED_ROLES):
     #     need = ", ".join(SAI_ALLOWED_ROLES)
@@ -842,13 +1241,13 @@ def spd_report():
         )
         embed.set_footer(text="BCSD • SPD")
 
-        ch = bot.get_channel(SPD_LOG_CHANNEL_ID)
-        if ch:
-            bot.loop.create_task(ch.send(embed=embed))
+        db.write(lambda conn: store_promotion_report(
+            conn, "SPD", author_id, author_name, rank_from, rank_to, work_report, SPD_LOG_CHANNEL_ID, embed
+        ))
 
         return redirect("/spd?ok=1")
 
-    return render_template("spd_report.html")
+    return page_cache.respond((), lambda: render_template("spd_report.html"))
 
 
 
@@ -859,5 +1258,12 @@ def run_flask():
     app.run(host="0.0.0.0", port=port)
 
 if __name__ == "__main__":
-    threading.Thread(target=run_flask).start()
-    bot.run(BOT_TOKEN)
+    if RUN_MODE == "bot":
+        bot.run(BOT_TOKEN)
+    elif RUN_MODE == "web":
+        responsive.build()
+        run_flask()  # лише для локальної перевірки; у проді — gunicorn app:app
+    else:
+        responsive.build()
+        threading.Thread(target=run_flask).start()
+        bot.run(BOT_TOKEN)
@@ -0,0 +1,342 @@
+"""Навантажувальний бенчмарк маршрутів Flask без Discord.
+
+    python bench.py                           # 500k actions, 100k оренд, 2000 учасників
+    python bench.py --actions 50000 --rentals 10000 --requests 200
+    python bench.py --out bench.json          # зберегти результати
+    python bench.py --baseline bench.json     # exit 1, якщо p99 / rps погіршились
+    python bench.py --cache cold              # GET лише без кешу сторінок (рендер + SQL)
+
+Піднімає `app` на тимчасовій копії БД, заповнює її даними, підставляє фейкову
+гільдію (учасники, ролі) замість бота і локальний стаб Discord API для OAuth,
+а тоді ганяє кожен сценарій у кількох потоках і друкує p50/p95/p99 та req/s.
+GET-сценарії за замовчуванням ідуть двічі: без кешу сторінок (кожен запит —
+рендер і запити до БД; ловить регресії обробників) і з кешем (позначка [кеш]).
+"""
+import argparse
+import json
+import os
+import random
+import secrets
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ── Стаб Discord API (OAuth) ──────────────────────────────────────────────────
+class _DiscordStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    role_ids = []
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, obj, status=200):
+        time.sleep(self.latency)
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._json({"access_token": secrets.token_hex(8), "token_type": "Bearer"})
+
+    def do_GET(self):
+        if self.path.endswith("/member"):
+            return self._json({"roles": [str(r) for r in self.role_ids]})
+        self._json({"id": str(random.randint(10**17, 10**18)), "username": "bench"})
+
+
+def start_stub(latency_ms: float):
+    _DiscordStub.latency = latency_ms / 1000
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _DiscordStub)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+# ── Дані ──────────────────────────────────────────────────────────────────────
+ACTIONS = ("Прийнято", "Підвищено", "Понижено", "Вигнано")
+WORDS = ("патруль", "рапорт", "іспит", "присяга", "порушення", "статут", "стаж", "лекція",
+         "догана", "заохочення", "тренування", "перевірка", "звіт", "виклик", "чергування")
+TS = "%Y-%m-%d %H:%M:%S"
+
+
+def _ts(rng, now, days=365):
+    return (now - timedelta(seconds=rng.randint(0, days * 86400))).strftime(TS)
+
+
+def seed(app_module, args, names, rng):
+    import db
+
+    now = datetime.now()
+    role_names = [f"Роль {i}" for i in range(args.roles)]
+    started = time.perf_counter()
+    with db.connect() as conn:
+        batch = []
+        for i in range(args.actions):
+            batch.append((
+                rng.choice(names), rng.choice(names), rng.choice(ACTIONS), rng.choice(role_names),
+                " ".join(rng.choices(WORDS, k=rng.randint(2, 6))), _ts(rng, now),
+            ))
+            if len(batch) >= 10000:
+                conn.executemany("INSERT INTO actions (executor, target, action, role, reason, date) VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+        if batch:
+            conn.executemany("INSERT INTO actions (executor, target, action, role, reason, date) VALUES (?, ?, ?, ?, ?, ?)", batch)
+
+        vehicles = app_module.VEHICLES
+        rows = []
+        for i in range(args.rentals):
+            v = rng.choice(vehicles)
+            taken = now - timedelta(seconds=rng.randint(3600, 365 * 86400))
+            hours = rng.choice((1, 2, 3, 4))
+            rows.append((
+                v["id"], v["plate"], v["name"], str(rng.randint(10**17, 10**18)), rng.choice(names),
+                f"{hours} год", rng.choice(WORDS), taken.strftime(TS),
+                (taken + timedelta(hours=hours, minutes=rng.randint(-30, 60))).strftime(TS),
+                (taken + timedelta(hours=hours)).strftime(TS),
+            ))
+        conn.executemany("""
+            INSERT INTO vehicle_rentals
+            (vehicle_id, plate, model, taken_by_id, taken_by_name, duration, reason, taken_at, returned_at, due_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+        # половина автопарку зараз в оренді
+        for v in vehicles[: len(vehicles) // 2]:
+            taken = now - timedelta(minutes=rng.randint(5, 300))
+            conn.execute("""
+                INSERT INTO vehicle_rentals
+                (vehicle_id, plate, model, taken_by_id, taken_by_name, duration, reason, taken_at, due_at)
+                VALUES (?, ?, ?, ?, ?, '2 год', 'bench', ?, ?)
+            """, (v["id"], v["plate"], v["name"], str(rng.randint(10**17, 10**18)), rng.choice(names),
+                  taken.strftime(TS), (taken + timedelta(hours=2)).strftime(TS)))
+
+        conn.executemany("""
+            INSERT INTO exam_requests (author_name, author_id, action_type, submitted_at) VALUES (?, ?, ?, ?)
+        """, [(rng.choice(names), str(rng.randint(10**17, 10**18)), rng.choice(("Іспит", "Присяга", "Лекція")),
+               _ts(rng, now)) for _ in range(args.actions // 25)])
+
+        conn.executemany("""
+            INSERT INTO promotion_reports (department, author_id, author_name, rank_from, rank_to, report, submitted_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(rng.choice(app_module.PROMOTION_DEPARTMENTS), str(rng.randint(10**17, 10**18)), rng.choice(names),
+               "1", "2", " ".join(rng.choices(WORDS, k=12)), _ts(rng, now)) for _ in range(args.actions // 50)])
+    with db.connect() as conn:
+        conn.execute("ANALYZE")
+    print(f"seed: {args.actions} actions, {args.rentals} rentals за {time.perf_counter() - started:.1f}s", flush=True)
+    return role_names
+
+
+def fake_guild(app_module, args, rng):
+    from guild_sync import MirroredGuild, MirroredMember, MirroredRole
+
+    guild = MirroredGuild(app_module.GUILD_ID)
+    guild.roles = [MirroredRole(10**15 + i, f"Роль {i}", guild) for i in range(args.roles)]
+    allowed = [MirroredRole(10**15 + args.roles + i, name, guild) for i, name in enumerate(app_module.ALLOWED_ROLES)]
+    guild.roles += allowed
+    for i in range(args.members):
+        roles = rng.sample(guild.roles, k=min(len(guild.roles), rng.randint(1, 5)))
+        name = f"{rng.choice(('Іван', 'Олег', 'Марія', 'Анна', 'Петро', 'Юлія', 'Max', 'Alex'))}_{i}"
+        guild.members.append(MirroredMember(10**17 + i, name, i % 50 == 0, roles, guild))
+    app_module.members_dir.load(guild)
+    app_module.role_index.load(guild)
+    _DiscordStub.role_ids = [r.id for r in allowed]
+    return guild
+
+
+# ── Сценарії ──────────────────────────────────────────────────────────────────
+def scenarios(app_module, names, rng):
+    free = [v["id"] for v in app_module.VEHICLES[len(app_module.VEHICLES) // 2:]]
+
+    def take_and_return(client):
+        r = client.post("/vehicles/take", data={
+            "vehicle_id": rng.choice(free), "duration": "1 год", "reason": "bench",
+            "idem_key": secrets.token_urlsafe(16),
+        })
+        if r.status_code != 302:
+            return r  # 400 — авто вже взяв інший потік: теж валідна відповідь
+        with app_module.db.connect() as conn:
+            rid = conn.execute(
+                "SELECT id FROM vehicle_rentals WHERE taken_by_id = ? AND returned_at IS NULL", (client.user_id,)
+            ).fetchone()[0]
+        return client.post("/vehicles/return", data={"rental_id": rid, "idem_key": secrets.token_urlsafe(16)})
+
+    return [
+        ("GET /vehicles", (200,), lambda c: c.get("/vehicles")),
+        ("GET /vehicles/fleet", (200,), lambda c: c.get("/vehicles/fleet")),
+        ("GET /dashboard", (200,), lambda c: c.get("/dashboard")),
+        ("GET /history", (200,), lambda c: c.get("/history")),
+        ("GET /history?executor", (200,), lambda c: c.get("/history", query_string={"executor": rng.choice(names)})),
+        ("GET /history?q", (200,), lambda c: c.get("/history", query_string={"q": rng.choice(WORDS)})),
+        ("GET /reports", (200,), lambda c: c.get("/reports")),
+        ("GET /stats", (200,), lambda c: c.get("/stats", query_string={"days": rng.choice((7, 30, 0))})),
+        ("GET /api/members", (200,), lambda c: c.get("/api/members", query_string={"q": rng.choice(names)[:2]})),
+        ("POST /dashboard", (302,), lambda c: c.post("/dashboard", data={
+            "user_id": str(10**17 + rng.randint(1, 100)), "full_name_id": "Bench", "action": rng.choice(ACTIONS),
+            "role_name": "Роль 1", "reason": "bench", "idem_key": secrets.token_urlsafe(16),
+        })),
+        ("POST /exam_request", (302,), lambda c: c.post("/exam_request", data={
+            "action_type": "Іспит", "idem_key": secrets.token_urlsafe(16),
+        })),
+        ("POST /vehicles/take+return", (302, 400), take_and_return),
+        ("GET /callback (OAuth stub)", (302,), lambda c: c.get("/callback", query_string={"code": "x", "state": "/vehicles"})),
+    ]
+
+
+def _client(app_module, user_id):
+    client = app_module.app.test_client()
+    client.user_id = user_id
+    with client.session_transaction() as s:
+        s["user"] = {"id": user_id, "username": f"bench{user_id}"}
+    return client
+
+
+def run_scenario(app_module, fn, expected, requests, concurrency):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    per_worker = max(1, requests // concurrency)
+
+    def worker(n):
+        client = _client(app_module, str(10**17 + 900000 + n))
+        mine = []
+        for _ in range(per_worker):
+            t = time.perf_counter()
+            r = fn(client)
+            r.get_data()  # потокові відповіді — до кінця
+            mine.append(time.perf_counter() - t)
+            if r.status_code not in expected:
+                with lock:
+                    errors.append(r.status_code)
+        with lock:
+            latencies.extend(mine)
+
+    for _ in range(max(1, per_worker // 10)):  # прогрів
+        fn(_client(app_module, str(10**17 + 999999))).get_data()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    q = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(q[49] * 1000, 2),
+        "p95_ms": round(q[94] * 1000, 2),
+        "p99_ms": round(q[98] * 1000, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if cur["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {base['p99_ms']} → {cur['p99_ms']} ms")
+        if cur["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {base['rps']} → {cur['rps']}")
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--actions", type=int, default=500_000)
+    p.add_argument("--rentals", type=int, default=100_000)
+    p.add_argument("--members", type=int, default=2000)
+    p.add_argument("--roles", type=int, default=60)
+    p.add_argument("--requests", type=int, default=400, help="запитів на сценарій")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--stub-latency-ms", type=float, default=50, help="затримка стабу Discord API")
+    p.add_argument("--only", help="лише сценарії, що містять цей рядок")
+    p.add_argument("--db", help="готова БД (копіюється; без заповнення)")
+    p.add_argument("--out", help="записати результати в JSON")
+    p.add_argument("--baseline", help="JSON попереднього запуску для порівняння")
+    p.add_argument("--tolerance", type=float, default=0.25, help="допустиме погіршення (частка)")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--cache", choices=("both", "cold", "warm"), default="both",
+                   help="GET без кешу сторінок (cold), з кешем (warm) чи обидва")
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bcsd-bench-")
+    db_path = os.path.join(workdir, "audit.db")
+    if args.db:
+        shutil.copy(args.db, db_path)
+    stub = start_stub(args.stub_latency_ms)
+
+    # оточення — до імпорту app (модулі читають його при імпорті)
+    os.environ["AUDIT_DB_PATH"] = db_path
+    os.environ["DISCORD_API_BASE"] = f"http://127.0.0.1:{stub.server_address[1]}"
+    os.environ["RUN_MODE"] = "all"
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ.setdefault("GUILD_ID", "1")
+    os.environ.setdefault("LOG_CHANNEL_ID", "1")
+    os.environ.setdefault("ALLOWED_ROLES", "Аудит")
+    os.environ.setdefault("DISCORD_REDIRECT_URI", "http://localhost/callback")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        import app as app_module
+        import ratelimit
+
+        # міряємо обробники, а не ліміти частоти POST (ratelimit.py)
+        ratelimit.buckets.limits, ratelimit.buckets.default = {}, (10**9, 10**9)
+
+        fake_guild(app_module, args, rng)
+        names = [m.display_name for m in app_module.members_dir._by_id.values()]
+        if not args.db:
+            seed(app_module, args, names, rng)
+
+        results = {}
+        print(f"{'сценарій':<30} {'req':>6} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        cache_max = app_module.pagecache.PAGE_CACHE_MAX
+        for name, expected, fn in scenarios(app_module, names, rng):
+            if args.only and args.only not in name:
+                continue
+            modes = ("cold", "warm") if args.cache == "both" else (args.cache,)
+            for mode in modes if name.startswith("GET") else ("warm",):
+                # cold: кеш ємністю 0 — кожна сторінка одразу витісняється, кожен запит — промах
+                app_module.pagecache.PAGE_CACHE_MAX = 0 if mode == "cold" else cache_max
+                app_module.page_cache.clear()
+                label = f"{name} [кеш]" if mode == "warm" and name.startswith("GET") else name
+                res = run_scenario(app_module, fn, expected, args.requests, args.concurrency)
+                results[label] = res
+                print(f"{label:<30} {res['requests']:>6} {res['errors']:>5} {res['rps']:>9} "
+                      f"{res['p50_ms']:>9} {res['p95_ms']:>9} {res['p99_ms']:>9}", flush=True)
+            app_module.pagecache.PAGE_CACHE_MAX = cache_max
+
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(results, f, ensure_ascii=False, indent=1)
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(results, json.load(f), args.tolerance)
+            if regressions:
+                print("РЕГРЕСІЇ:\n  " + "\n  ".join(regressions))
+                sys.exit(1)
+            print("регресій немає")
+    finally:
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
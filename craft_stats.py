@@ -0,0 +1,80 @@
+import db
+
+
+# ── Позиції крафт-звітів і аналітика витрат ───────────────────────────────────
+# Кожна позиція звіту — окремий рядок craft_report_items (поряд із items_json для
+# сумісності). Час і автор звіту продубльовані в позиції, тож "скільки X скрафтили
+# за тиждень і ким" — один GROUP BY по індексу, без розбору JSON у Python.
+
+CONSUMPTION_GROUPS = {
+    "item":    "i.item",
+    "member":  "i.author_id",
+    "purpose": "r.purpose",
+    "day":     "substr(i.submitted_at, 1, 10)",
+    "week":    "strftime('%Y-W%W', i.submitted_at)",
+    "month":   "substr(i.submitted_at, 1, 7)",
+}
+CONSUMPTION_LIMIT = 500
+
+
+def store_items(conn, report_id: int, author_id: str, submitted_at: str, breakdown: list):
+    """Позиції з compute_craft_cost — у транзакції conn, разом з INSERT звіту."""
+    conn.executemany("""
+        INSERT INTO craft_report_items
+            (report_id, item, qty, unit_cost, cost, is_weapon, author_id, submitted_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (report_id, it["key"], it["qty"], it["unit_cost"], it["cost"], int(it["is_weapon"]),
+         str(author_id), submitted_at)
+        for it in breakdown
+    ])
+
+
+def consumption(args, group: str = "item") -> list:
+    """Витрати за group (див. CONSUMPTION_GROUPS) з фільтрами date_from/date_to/item/author/purpose/weapons.
+
+    Рядки: (ключ, автор (для member), штук, матеріалів, звітів), від найбільших витрат.
+    """
+    key = CONSUMPTION_GROUPS[group]
+    where, params = [], []
+
+    date_from = (args.get("date_from") or "").strip()
+    date_to   = (args.get("date_to") or "").strip()
+    if date_from:
+        where.append("i.submitted_at >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("i.submitted_at < date(?, '+1 day')")
+        params.append(date_to)
+
+    item = (args.get("item") or "").strip()
+    if item:
+        where.append("i.item = ?")
+        params.append(item)
+
+    author = (args.get("author") or "").strip()
+    if author:
+        where.append("i.author_id = ?" if author.isdigit() else "r.author_name = ?")
+        params.append(author)
+
+    purpose = (args.get("purpose") or "").strip()
+    if purpose:
+        where.append("r.purpose = ?")
+        params.append(purpose)
+
+    weapons = (args.get("weapons") or "").strip()
+    if weapons in ("0", "1"):
+        where.append("i.is_weapon = ?")
+        params.append(int(weapons))
+
+    sql_where = ("WHERE " + " AND ".join(where)) if where else ""
+    with db.connect() as conn:
+        return conn.execute(f"""
+            SELECT {key}, MAX(r.author_name), SUM(i.qty), SUM(i.cost), COUNT(DISTINCT i.report_id)
+            FROM craft_report_items i
+            JOIN craft_reports r ON r.id = i.report_id
+            {sql_where}
+            GROUP BY {key}
+            ORDER BY SUM(i.cost) DESC, {key}
+            LIMIT ?
+        """, (*params, CONSUMPTION_LIMIT)).fetchall()
@@ -0,0 +1,183 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import metrics
+
+
+# ── Налаштування ───────────────────────────────────────────────────────────────
+DB_PATH = os.getenv("AUDIT_DB_PATH", "audit.db")
+
+DB_POOL_SIZE       = int(os.getenv("DB_POOL_SIZE", 8))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+DB_MMAP_SIZE       = int(os.getenv("DB_MMAP_SIZE", 256 * 1024 * 1024))
+DB_STMT_CACHE      = int(os.getenv("DB_STMT_CACHE", 256))
+
+DB_BATCH_MAX      = int(os.getenv("DB_BATCH_MAX", 64))
+DB_BATCH_WAIT_SEC = float(os.getenv("DB_BATCH_WAIT_MS", 5)) / 1000
+DB_WRITE_TIMEOUT  = float(os.getenv("DB_WRITE_TIMEOUT", 10))
+
+# Пул вільних з'єднань (LIFO — "гаряче" з'єднання з теплим кешем береться першим)
+_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+
+
+class _TimedCursor(sqlite3.Cursor):
+    # час і кількість запитів — для /metrics
+    def execute(self, *args):
+        t = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            metrics.record_query(time.perf_counter() - t)
+
+    def executemany(self, *args):
+        t = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            metrics.record_query(time.perf_counter() - t)
+
+
+class _TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    # вбудовані execute*/ створюють базовий курсор в обхід cursor() — перенаправляємо
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+def _open() -> sqlite3.Connection:
+    return open_file(DB_PATH)
+
+
+def open_file(path: str) -> sqlite3.Connection:
+    """Нове з'єднання з файлом БД з тими самими PRAGMA (і для окремих файлів, напр. sessions.db)."""
+    conn = sqlite3.connect(
+        path,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,          # з'єднання ходять між потоками через пул
+        cached_statements=DB_STMT_CACHE,  # кеш підготовлених запитів
+        factory=_TimedConnection,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")  # читачі не блокуються записом
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _acquire() -> sqlite3.Connection:
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        return _open()
+
+
+def _release(conn: sqlite3.Connection):
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+@contextmanager
+def connect():
+    """З'єднання з пулу на час блоку: commit при успіху, rollback при помилці."""
+    conn = _acquire()
+    try:
+        with conn:
+            yield conn
+    finally:
+        _release(conn)
+
+
+def close_all():
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+# ── Пакетний запис (group commit) ─────────────────────────────────────────────
+# Записи з різних потоків збираються в одну транзакцію: один writer-lock і один
+# fsync на пачку замість одного на запит. Кожна робота — у своєму SAVEPOINT,
+# тож помилка однієї не відкочує інші. Викликач чекає на commit своєї пачки.
+
+class BatchWriter:
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="db-batch-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, fn) -> Future:
+        """fn(conn) виконається в пакетній транзакції; Future — його результат після commit."""
+        self._ensure_started()
+        fut = Future()
+        self._jobs.put((fn, fut))
+        return fut
+
+    def _collect(self):
+        batch = [self._jobs.get()]
+        deadline = time.monotonic() + DB_BATCH_WAIT_SEC
+        while len(batch) < DB_BATCH_MAX:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                batch.append(self._jobs.get(timeout=left))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            results = []
+            try:
+                with connect() as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for i, (fn, _) in enumerate(batch):
+                        conn.execute(f"SAVEPOINT job{i}")
+                        try:
+                            results.append((fn(conn), None))
+                            conn.execute(f"RELEASE job{i}")
+                        except Exception as e:
+                            conn.execute(f"ROLLBACK TO job{i}")
+                            conn.execute(f"RELEASE job{i}")
+                            results.append((None, e))
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), (result, error) in zip(batch, results):
+                if error is None:
+                    fut.set_result(result)
+                else:
+                    fut.set_exception(error)
+
+
+writer = BatchWriter()
+
+
+def write(fn):
+    """Синхронний запис через пакетну транзакцію: повертає fn(conn) після commit."""
+    return writer.submit(fn).result(timeout=DB_WRITE_TIMEOUT)
@@ -0,0 +1,71 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# ── HTTP-клієнт Discord OAuth ─────────────────────────────────────────────────
+# Один спільний requests.Session (keep-alive, пул з'єднань), явні таймаути та
+# повтори: 429 — з урахуванням Retry-After, 5xx — лише для GET.
+# DISCORD_API_BASE дозволяє направити клієнт на локальний стаб-сервер.
+
+DISCORD_API_BASE      = os.getenv("DISCORD_API_BASE", "https://discord.com/api").rstrip("/")
+OAUTH_CONNECT_TIMEOUT = float(os.getenv("OAUTH_CONNECT_TIMEOUT", 3.05))
+OAUTH_READ_TIMEOUT    = float(os.getenv("OAUTH_READ_TIMEOUT", 10))
+OAUTH_MAX_RETRIES     = int(os.getenv("OAUTH_MAX_RETRIES", 3))
+OAUTH_MAX_RETRY_AFTER = float(os.getenv("OAUTH_MAX_RETRY_AFTER", 5))
+OAUTH_POOL_SIZE       = int(os.getenv("OAUTH_POOL_SIZE", 16))
+
+
+class DiscordOAuth:
+    def __init__(self, client_id, client_secret, redirect_uri, api_base=DISCORD_API_BASE):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.api_base = api_base.rstrip("/")
+        self.timeout = (OAUTH_CONNECT_TIMEOUT, OAUTH_READ_TIMEOUT)
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=OAUTH_POOL_SIZE)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+        self._pool = ThreadPoolExecutor(max_workers=OAUTH_POOL_SIZE, thread_name_prefix="oauth")
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        delay = 0.5
+        for attempt in range(OAUTH_MAX_RETRIES + 1):
+            r = self.http.request(method, self.api_base + path, timeout=self.timeout, **kwargs)
+            last = attempt == OAUTH_MAX_RETRIES
+            if r.status_code == 429 and not last:
+                try:
+                    wait = float(r.headers.get("Retry-After", delay))
+                except ValueError:
+                    wait = delay
+                if wait > OAUTH_MAX_RETRY_AFTER:
+                    return r  # довше чекати не будемо — хай користувач спробує пізніше
+                time.sleep(wait)
+            elif r.status_code >= 500 and method == "GET" and not last:
+                time.sleep(delay)
+            else:
+                return r
+            delay *= 2
+        return r
+
+    def exchange_code(self, code: str) -> requests.Response:
+        return self._request("POST", "/oauth2/token", data={
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": self.redirect_uri,
+        }, headers={"Content-Type": "application/x-www-form-urlencoded"})
+
+    def fetch_identity(self, access_token: str, guild_id: int):
+        """Паралельно тягне /users/@me і членство в гільдії. Повертає (user_resp, member_resp)."""
+        headers = {"Authorization": f"Bearer {access_token}"}
+        user = self._pool.submit(self._request, "GET", "/users/@me", headers=headers)
+        member = self._pool.submit(self._request, "GET", f"/users/@me/guilds/{guild_id}/member", headers=headers)
+        return user.result(), member.result()
@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import zlib
+
+import db
+
+
+# ── Експорт audit.db ───────────────────────────────────────────────────────────
+# Знімок — через SQLite backup API покроково (писачі між кроками не блокуються),
+# віддається потоком у gzip. Таблиці — потоком CSV / NDJSON рядок за рядком,
+# пам'ять не залежить від розміру таблиці.
+
+EXPORT_TABLES = ("actions", "vehicle_rentals", "exam_requests", "craft_reports", "craft_report_items", "promotion_reports")
+# не потрапляють у знімок /download_db: ключі форм користувачів, (старі) сесії
+SNAPSHOT_EXCLUDE = ("idempotency_keys", "sessions")
+EXPORT_FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", 256))
+BACKUP_STEP_SLEEP     = float(os.getenv("BACKUP_STEP_SLEEP_MS", 5)) / 1000
+STREAM_CHUNK          = 64 * 1024
+FETCH_BATCH           = 500
+
+
+def snapshot_gzip():
+    """Узгоджений знімок БД, стиснутий gzip, шматками по STREAM_CHUNK."""
+    fd, tmp_path = tempfile.mkstemp(prefix="audit-snapshot-", suffix=".db")
+    os.close(fd)
+    try:
+        dst = sqlite3.connect(tmp_path)
+        try:
+            with db.connect() as src:
+                src.backup(dst, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+            # службові секрети — геть; VACUUM прибирає і їхні вільні сторінки
+            for table in SNAPSHOT_EXCLUDE:
+                dst.execute(f"DROP TABLE IF EXISTS {table}")
+            dst.commit()
+            dst.execute("VACUUM")
+        finally:
+            dst.close()
+
+        gz = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 — gzip-контейнер
+        with open(tmp_path, "rb") as f:
+            while True:
+                chunk = f.read(STREAM_CHUNK)
+                if not chunk:
+                    break
+                out = gz.compress(chunk)
+                if out:
+                    yield out
+        yield gz.flush()
+    finally:
+        os.remove(tmp_path)
+
+
+def _rows(table: str):
+    # одна read-транзакція на весь експорт (WAL) — узгоджений зріз таблиці
+    with db.connect() as conn:
+        cur = conn.execute(f"SELECT * FROM {table} ORDER BY id")
+        yield [d[0] for d in cur.description]
+        while True:
+            batch = cur.fetchmany(FETCH_BATCH)
+            if not batch:
+                break
+            yield from batch
+
+
+def table_csv(table: str):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    rows = _rows(table)
+    buf.write("\ufeff")  # BOM — щоб Excel відкрив кирилицю
+    w.writerow(next(rows))
+    for i, row in enumerate(rows, 1):
+        w.writerow(row)
+        if i % FETCH_BATCH == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def table_ndjson(table: str):
+    rows = _rows(table)
+    cols = next(rows)
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(cols, row)), ensure_ascii=False))
+        if len(lines) >= FETCH_BATCH:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def table_stream(table: str, fmt: str):
+    if table not in EXPORT_TABLES or fmt not in EXPORT_FORMATS:
+        raise KeyError(f"{table}.{fmt}")
+    return table_csv(table) if fmt == "csv" else table_ndjson(table)
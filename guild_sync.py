@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+
+import db
+
+
+# ── Дзеркало гільдії в audit.db ───────────────────────────────────────────────
+# У режимі окремих процесів (RUN_MODE=bot / RUN_MODE=web) веб-воркери не мають
+# з'єднання з гейтвеєм Discord. Бот пише учасників і ролі в таблиці guild_members /
+# guild_roles і збільшує лічильник версії; веб-воркер раз на GUILD_SYNC_SEC звіряє
+# версію і, якщо вона змінилась, перезавантажує MemberDirectory та RoleIndex.
+
+GUILD_SYNC_SEC = float(os.getenv("GUILD_SYNC_SEC", 5))
+
+
+class MirroredRole:
+    __slots__ = ("id", "name", "guild")
+
+    def __init__(self, id, name, guild):
+        self.id, self.name, self.guild = id, name, guild
+
+
+class MirroredMember:
+    __slots__ = ("id", "display_name", "bot", "roles", "guild")
+
+    def __init__(self, id, display_name, bot, roles, guild):
+        self.id, self.display_name, self.bot, self.roles, self.guild = id, display_name, bot, roles, guild
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+
+class MirroredGuild:
+    def __init__(self, id):
+        self.id = id
+        self.roles = []
+        self.members = []
+
+
+def _member_row(m):
+    return (m.id, m.display_name, int(m.bot), json.dumps([r.id for r in m.roles]))
+
+
+class GuildMirror:
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self._seen_version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # ── Запис (процес бота; викликати через asyncio.to_thread) ──
+    def _bump(self, conn):
+        conn.execute("UPDATE guild_sync SET version = version + 1 WHERE id = 1")
+
+    def write_snapshot(self, guild):
+        with db.connect() as conn:
+            conn.execute("DELETE FROM guild_roles")
+            conn.executemany("INSERT INTO guild_roles (id, name) VALUES (?, ?)",
+                             [(r.id, r.name) for r in guild.roles])
+            conn.execute("DELETE FROM guild_members")
+            conn.executemany(
+                "INSERT INTO guild_members (id, display_name, is_bot, role_ids) VALUES (?, ?, ?, ?)",
+                [_member_row(m) for m in guild.members],
+            )
+            self._bump(conn)
+
+    def upsert_member(self, member):
+        if member.guild.id != self.guild_id:
+            return
+        with db.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO guild_members (id, display_name, is_bot, role_ids) VALUES (?, ?, ?, ?)",
+                _member_row(member),
+            )
+            self._bump(conn)
+
+    def remove_member(self, member):
+        if member.guild.id != self.guild_id:
+            return
+        with db.connect() as conn:
+            conn.execute("DELETE FROM guild_members WHERE id = ?", (member.id,))
+            self._bump(conn)
+
+    def upsert_role(self, role):
+        if role.guild.id != self.guild_id:
+            return
+        with db.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO guild_roles (id, name) VALUES (?, ?)", (role.id, role.name))
+            self._bump(conn)
+
+    def remove_role(self, role):
+        if role.guild.id != self.guild_id:
+            return
+        with db.connect() as conn:
+            conn.execute("DELETE FROM guild_roles WHERE id = ?", (role.id,))
+            self._bump(conn)
+
+    # ── Читання (веб-процес) ──
+    def _load(self, conn) -> MirroredGuild:
+        guild = MirroredGuild(self.guild_id)
+        roles = {}
+        for rid, name in conn.execute("SELECT id, name FROM guild_roles"):
+            roles[rid] = MirroredRole(rid, name, guild)
+        guild.roles = list(roles.values())
+        for mid, name, is_bot, role_ids in conn.execute(
+            "SELECT id, display_name, is_bot, role_ids FROM guild_members"
+        ):
+            member_roles = [roles[r] for r in json.loads(role_ids) if r in roles]
+            guild.members.append(MirroredMember(mid, name, bool(is_bot), member_roles, guild))
+        return guild
+
+    def refresh(self, members_dir, role_index):
+        """Перезавантажує довідники, якщо бот оновив дзеркало. Не частіше ніж раз на GUILD_SYNC_SEC."""
+        now = time.monotonic()
+        if now - self._checked_at < GUILD_SYNC_SEC:
+            return
+        if not self._lock.acquire(blocking=False):
+            return  # інший потік уже оновлює
+        try:
+            self._checked_at = now
+            with db.connect() as conn:
+                version = conn.execute("SELECT version FROM guild_sync WHERE id = 1").fetchone()[0]
+                if version == self._seen_version or version == 0:
+                    return
+                guild = self._load(conn)
+            members_dir.load(guild)
+            role_index.load(guild)
+            self._seen_version = version
+        finally:
+            self._lock.release()
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+
+# ── Gunicorn: веб-воркери + окремий процес бота на тому ж хості ───────────────
+# Веб-воркери (RUN_MODE=web) масштабуються WEB_CONCURRENCY / WEB_THREADS; бот
+# (RUN_MODE=bot) — один процес поруч, спілкується з вебом через audit.db
+# (outbox, дзеркало гільдії, оренда, метрики) і sessions.db. Тому бот мусить
+# жити на тому ж хості/файловій системі: його запускає майстер gunicorn і
+# перезапускає, якщо той впав. Окремий тип процесу в Procfile отримав би власний
+# контейнер без спільної БД. START_BOT=0 — бот запущено інакше на цьому ж хості;
+# навіть тоді кілька ботів не дублюють доставку — працює власник оренди (lease.py).
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("WEB_THREADS", 4))
+worker_class = "gthread"
+timeout = 60
+
+BOT_RESTART_SEC = 5
+
+_bot_proc = None
+_stopping = threading.Event()
+
+
+def on_starting(server):
+    global _bot_proc
+    # варіанти фонів будуються один раз у майстрі, до форку воркерів
+    from images import ResponsiveImages
+    ResponsiveImages(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")).build()
+
+    if os.getenv("START_BOT", "1") != "1":
+        return  # бот запущено окремо (інший юніт / контейнер на тому ж хості)
+    _bot_proc = _spawn_bot(server)
+    threading.Thread(target=_watch_bot, args=(server,), daemon=True).start()
+
+
+def _spawn_bot(server):
+    env = {**os.environ, "RUN_MODE": "bot"}
+    proc = subprocess.Popen([sys.executable, "app.py"], env=env)
+    server.log.info("Discord bot started (pid %s)", proc.pid)
+    return proc
+
+
+def _watch_bot(server):
+    # потік лише в майстрі (воркери форкаються без нього): бот упав — піднімаємо знову
+    global _bot_proc
+    while True:
+        code = _bot_proc.wait()
+        if _stopping.is_set():
+            return
+        server.log.warning("Discord bot exited (code %s), restarting in %ss", code, BOT_RESTART_SEC)
+        time.sleep(BOT_RESTART_SEC)
+        if _stopping.is_set():
+            return
+        _bot_proc = _spawn_bot(server)
+
+
+def on_exit(server):
+    _stopping.set()
+    if _bot_proc and _bot_proc.poll() is None:
+        _bot_proc.terminate()
+        _bot_proc.wait(timeout=10)
@@ -0,0 +1,151 @@
+import os
+import re
+import threading
+import time
+from functools import wraps
+
+from flask import g, make_response, redirect, request, session
+from markupsafe import Markup
+
+import db
+
+
+# ── Ідемпотентні POST-форми ───────────────────────────────────────────────────
+# Кожна форма несе одноразовий ключ (прихованим полем; генерує браузер при
+# відкритті сторінки — тож HTML лишається однаковим і його можна кешувати,
+# а кожен перегляд форми отримує свій ключ). Перший POST з ключем
+# "займає" його в idempotency_keys і виконує обробник; повтори (подвійний клік,
+# F5, ретрай проксі) — лише пошук за первинним ключем: або чекають завершення
+# першого, або одразу отримують його відповідь (редирект). Запам'ятовуються лише
+# редиректи (успіх); помилки валідації та інші відповіді ключ звільняють — форму
+# можна виправити й надіслати знову.
+
+IDEMPOTENCY_FIELD        = "idem_key"
+IDEMPOTENCY_TTL_HOURS    = int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24))
+IDEMPOTENCY_WAIT_SEC     = float(os.getenv("IDEMPOTENCY_WAIT_SEC", 5))
+IDEMPOTENCY_INFLIGHT_SEC = int(os.getenv("IDEMPOTENCY_INFLIGHT_SEC", 60))
+IDEMPOTENCY_PRUNE_SEC    = 3600
+
+_KEY_RE = re.compile(r"[A-Za-z0-9_-]{16,64}")
+_POLL_SEC = 0.1
+
+_pruned_at = 0.0
+_prune_lock = threading.Lock()
+
+
+_FIELD_HTML = Markup(
+    f'<input type="hidden" name="{IDEMPOTENCY_FIELD}">'
+    "<script>document.currentScript.previousElementSibling.value = self.crypto && crypto.randomUUID"
+    " ? crypto.randomUUID().replace(/-/g, '')"
+    " : Date.now().toString(36) + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);</script>"
+)
+
+
+def form_field() -> Markup:
+    """Приховане поле для ключа — для jinja: {{ idempotency_field() }}."""
+    return _FIELD_HTML
+
+
+def _prune():
+    global _pruned_at
+    now = time.monotonic()
+    if now - _pruned_at < IDEMPOTENCY_PRUNE_SEC or not _prune_lock.acquire(blocking=False):
+        return
+    try:
+        _pruned_at = now
+        with db.connect() as conn:
+            conn.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)",
+                (f"-{IDEMPOTENCY_TTL_HOURS} hours",),
+            )
+    finally:
+        _prune_lock.release()
+
+
+def _claim(user_id: str, key: str, endpoint: str):
+    """(True, None) — ключ наш; (False, row) — вже є запис (status, location, endpoint)."""
+    with db.connect() as conn:
+        claimed = conn.execute("""
+            INSERT OR IGNORE INTO idempotency_keys (user_id, key, endpoint, created_at)
+            VALUES (?, ?, ?, datetime('now'))
+        """, (user_id, key, endpoint)).rowcount
+        if claimed:
+            return True, None
+        # "завислий" запит (процес упав посеред обробки) — перехоплюємо ключ
+        stolen = conn.execute("""
+            UPDATE idempotency_keys SET created_at = datetime('now')
+            WHERE user_id = ? AND key = ? AND status IS NULL AND created_at < datetime('now', ?)
+        """, (user_id, key, f"-{IDEMPOTENCY_INFLIGHT_SEC} seconds")).rowcount
+        if stolen:
+            return True, None
+        return False, conn.execute(
+            "SELECT status, location, endpoint FROM idempotency_keys WHERE user_id = ? AND key = ?",
+            (user_id, key),
+        ).fetchone()
+
+
+def _lookup(user_id: str, key: str):
+    with db.connect() as conn:
+        return conn.execute(
+            "SELECT status, location, endpoint FROM idempotency_keys WHERE user_id = ? AND key = ?",
+            (user_id, key),
+        ).fetchone()
+
+
+def _forget(user_id: str, key: str):
+    with db.connect() as conn:
+        conn.execute("DELETE FROM idempotency_keys WHERE user_id = ? AND key = ?", (user_id, key))
+
+
+def _finish(user_id: str, key: str, resp):
+    if not 300 <= resp.status_code < 400:
+        _forget(user_id, key)
+        return
+    with db.connect() as conn:
+        conn.execute(
+            "UPDATE idempotency_keys SET status = ?, location = ? WHERE user_id = ? AND key = ?",
+            (resp.status_code, resp.headers.get("Location"), user_id, key),
+        )
+
+
+def _replay(row):
+    status, location, endpoint = row
+    if endpoint != request.endpoint:
+        return "❌ Ключ форми вже використано для іншої дії.", 409
+    return redirect(location, status)
+
+
+def idempotent(view):
+    """Декоратор для обробників із POST: повтор тієї самої форми не виконує роботу вдруге."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.form.get(IDEMPOTENCY_FIELD, "") if request.method == "POST" else ""
+        if not _KEY_RE.fullmatch(key) or "user" not in session:
+            return view(*args, **kwargs)  # старі форми без ключа — як раніше
+
+        user_id = str(session["user"]["id"])
+        _prune()
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SEC
+        while True:
+            claimed, row = _claim(user_id, key, request.endpoint)
+            if claimed:
+                break
+            while row is not None and row[0] is None and time.monotonic() < deadline:
+                time.sleep(_POLL_SEC)  # перший запит ще виконується — чекаємо його відповідь
+                row = _lookup(user_id, key)
+            if row is None:
+                continue  # перша спроба завершилась помилкою і звільнила ключ — виконуємо самі
+            g.idempotent_replay = True  # роботи не було — @rate_limited поверне токен
+            if row[0] is None:
+                return "⏳ Цей запит уже обробляється.", 409
+            return _replay(row)
+
+        try:
+            resp = make_response(view(*args, **kwargs))
+        except Exception:
+            _forget(user_id, key)
+            raise
+        _finish(user_id, key, resp)
+        return resp
+
+    return wrapper
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+
+from markupsafe import Markup
+
+
+# ── Адаптивні фонові зображення ───────────────────────────────────────────────
+# Для кожного фону з RESPONSIVE_IMAGES будуються варіанти кількох ширин у AVIF /
+# WebP / progressive JPEG з хешем вмісту в імені (static/build/). Шаблони
+# отримують CSS-змінну --bg-img через responsive_bg(), браузер сам обирає формат,
+# а медіа-запити — ширину. Без Pillow або до збірки — віддається оригінал.
+
+RESPONSIVE_IMAGES = ("bg.jpg", "bg2.jpg", "bg3.jpg")
+RESPONSIVE_WIDTHS = (640, 1024, 1536)
+
+# порядок = пріоритет у image-set(); JPEG завжди останній як запасний
+FORMATS = {
+    "avif": {"mime": "image/avif", "save": {"format": "AVIF", "quality": 55, "speed": 6}},
+    "webp": {"mime": "image/webp", "save": {"format": "WEBP", "quality": 78, "method": 4}},
+    "jpg":  {"mime": "image/jpeg", "save": {"format": "JPEG", "quality": 80, "optimize": True, "progressive": True}},
+}
+
+BUILD_SUBDIR = "build"
+MANIFEST = "manifest.json"
+CACHE_FOREVER = "public, max-age=31536000, immutable"
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def build(static_dir: str) -> dict:
+    """Генерує відсутні/застарілі варіанти і пише manifest.json. Повертає маніфест."""
+    from PIL import Image, features
+
+    out_dir = os.path.join(static_dir, BUILD_SUBDIR)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = _read_manifest(out_dir)
+    formats = {k: v for k, v in FORMATS.items() if k != "avif" or features.check("avif")}
+
+    for name in RESPONSIVE_IMAGES:
+        src = os.path.join(static_dir, name)
+        if not os.path.exists(src):
+            continue
+        with open(src, "rb") as f:
+            source_hash = _sha(f.read())
+        entry = manifest.get(name)
+        if entry and entry["source"] == source_hash and all(
+            os.path.exists(os.path.join(out_dir, fn)) for v in entry["variants"].values() for fn in v.values()
+        ):
+            continue
+
+        stem = os.path.splitext(name)[0]
+        variants = {}
+        with Image.open(src) as im:
+            im = im.convert("RGB")  # заодно відкидає EXIF/ICC-метадані
+            for width in RESPONSIVE_WIDTHS:
+                w = min(width, im.width)
+                resized = im if w == im.width else im.resize((w, round(im.height * w / im.width)), Image.LANCZOS)
+                files = {}
+                for ext, spec in formats.items():
+                    tmp = os.path.join(out_dir, f".{stem}-{w}.{ext}.tmp")
+                    resized.save(tmp, **spec["save"])
+                    with open(tmp, "rb") as f:
+                        digest = _sha(f.read())[:10]
+                    final = f"{stem}-{w}.{digest}.{ext}"
+                    os.replace(tmp, os.path.join(out_dir, final))
+                    files[ext] = final
+                variants[str(w)] = files
+                if w == im.width:
+                    break  # не збільшуємо
+        manifest[name] = {"source": source_hash, "variants": variants}
+        print(f"IMAGES: built {len(variants)} width(s) for {name}", flush=True)
+
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+def _read_manifest(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class ResponsiveImages:
+    def __init__(self, static_dir: str, static_url: str = "/static"):
+        self.static_dir = static_dir
+        self.build_url = f"{static_url}/{BUILD_SUBDIR}"
+        self.static_url = static_url
+        self._manifest = None
+        self._css = {}
+        self._lock = threading.Lock()
+
+    def build(self):
+        try:
+            self._manifest = build(self.static_dir)
+        except ImportError:
+            print("IMAGES: Pillow не встановлено — фони віддаються як є", flush=True)
+            self._manifest = {}
+        self._css = {}
+
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            with self._lock:
+                if self._manifest is None:
+                    self._manifest = _read_manifest(os.path.join(self.static_dir, BUILD_SUBDIR))
+        return self._manifest
+
+    def _url(self, filename: str) -> str:
+        return f"{self.build_url}/{filename}"
+
+    def _image_set(self, files: dict) -> str:
+        parts = [f'url("{self._url(files[ext])}") type("{FORMATS[ext]["mime"]}")' for ext in FORMATS if ext in files]
+        return "image-set(" + ", ".join(parts) + ")"
+
+    def css(self, name: str, var: str = "--bg-img") -> Markup:
+        """<style> з CSS-змінною var: потрібна ширина через @media, формат через image-set()."""
+        if name in self._css:
+            return self._css[name]
+        entry = self.manifest().get(name)
+        if not entry:
+            return Markup(f'<style>:root{{{var}: url("{self.static_url}/{name}")}}</style>')
+
+        rules, prev = [], None
+        for w, files in sorted(entry["variants"].items(), key=lambda kv: int(kv[0])):
+            block = (
+                f':root{{{var}: url("{self._url(files["jpg"])}")}}'
+                f'@supports (background-image: image-set(url("x") type("image/webp"))){{'
+                f':root{{{var}: {self._image_set(files)}}}}}'
+            )
+            rules.append(block if prev is None else f"@media (min-width: {int(prev) + 1}px){{{block}}}")
+            prev = w
+        css = Markup("<style>" + "".join(rules) + "</style>")
+        self._css[name] = css
+        return css
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+
+# ── Обробка фото до звітів крафту ─────────────────────────────────────────────
+# Запит лише зберігає завантаження в тимчасові файли (поза транзакцією БД),
+# комітить звіт і відкладений запис outbox, а решту робить пул воркерів:
+# перевірка, що це справді зображення, зняття метаданих, прев'ю і мініатюра у
+# WebP, дедуплікація за хешем вмісту, прикріплення файлів до повідомлення Discord.
+# Сирі завантаження (ще з EXIF/GPS) лежать поза static/ — у INGEST_STAGING_DIR;
+# якщо процес упав до обробки, їх прибирає прочищення при старті
+# (файли, старші за INGEST_STALE_SEC: свіжі може ще обробляти сусідній воркер).
+
+INGEST_WORKERS     = int(os.getenv("INGEST_WORKERS", 2))
+MAX_PHOTOS         = 10            # ліміт вкладень в одному повідомленні Discord
+PREVIEW_MAX_SIDE   = 1600
+THUMB_MAX_SIDE     = 320
+MAX_IMAGE_PIXELS   = 40_000_000    # захист від "декомпресійних бомб"
+ACCEPTED_FORMATS   = {"JPEG", "PNG", "WEBP"}
+COPY_CHUNK         = 1024 * 1024
+INGEST_STAGING_DIR = os.getenv("INGEST_STAGING_DIR", os.path.join(tempfile.gettempdir(), "bcsd-craft-incoming"))
+INGEST_STALE_SEC   = int(os.getenv("INGEST_STALE_SEC", 3600))
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PhotoIngest:
+    def __init__(self, upload_dir: str, url_prefix: str, outbox):
+        self.upload_dir = upload_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.incoming_dir = INGEST_STAGING_DIR
+        os.makedirs(self.incoming_dir, mode=0o700, exist_ok=True)
+        self.outbox = outbox
+        self._pool = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+        self.sweep()
+
+    def sweep(self):
+        """Видаляє покинуті тимчасові файли (процес упав між комітом звіту й обробкою)."""
+        cutoff = time.time() - INGEST_STALE_SEC
+        legacy = os.path.join(self.upload_dir, "incoming")  # колишнє місце — під static/
+        removed = 0
+        for folder, stale_only in ((self.incoming_dir, True), (legacy, False)):
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    if not stale_only or os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        try:
+            os.rmdir(legacy)
+        except OSError:
+            pass
+        if removed:
+            print(f"INGEST: видалено {removed} покинутих завантажень", flush=True)
+
+    # ── Flask-потік ──
+    def stage(self, files) -> list:
+        """Потоково зберігає завантаження у тимчасові файли. Повертає їхні шляхи."""
+        staged = []
+        for f in files[:MAX_PHOTOS]:
+            tmp = os.path.join(self.incoming_dir, uuid.uuid4().hex)
+            with open(tmp, "wb") as out:
+                shutil.copyfileobj(f.stream, out, COPY_CHUNK)
+            staged.append(tmp)
+        return staged
+
+    def submit(self, craft_id: int, outbox_id: int, embed, staged: list):
+        self._pool.submit(self._process, craft_id, outbox_id, embed, staged)
+
+    def discard(self, staged: list):
+        # звіт не прийнято — тимчасові файли більше не потрібні
+        for src in staged:
+            try:
+                os.remove(src)
+            except OSError:
+                pass
+
+    # ── Воркер ──
+    def _render(self, src: str, digest: str):
+        from PIL import Image, ImageOps
+
+        Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+        with Image.open(src) as probe:
+            if probe.format not in ACCEPTED_FORMATS:
+                raise ValueError(f"unsupported format {probe.format}")
+            # Pillow лише попереджає до 2×MAX_IMAGE_PIXELS — межу перевіряємо самі
+            if probe.width * probe.height > MAX_IMAGE_PIXELS:
+                raise ValueError(f"image too large {probe.width}x{probe.height}")
+            probe.verify()  # цілісність файлу; після verify() об'єкт непридатний
+
+        preview_name = f"{digest[:32]}.webp"
+        thumb_name = f"{digest[:32]}_thumb.webp"
+        preview_path = os.path.join(self.upload_dir, preview_name)
+        thumb_path = os.path.join(self.upload_dir, thumb_name)
+        if os.path.exists(preview_path) and os.path.exists(thumb_path):
+            return preview_name, thumb_name  # такий самий файл уже оброблено
+
+        with Image.open(src) as im:
+            im = ImageOps.exif_transpose(im)  # врахувати орієнтацію до того, як викинемо EXIF
+            im = im.convert("RGBA" if im.mode in ("RGBA", "LA", "P") else "RGB")
+            # нове зображення з самих пікселів — без EXIF/GPS/ICC
+            clean = Image.frombytes(im.mode, im.size, im.tobytes())
+            for path, side, quality in ((preview_path, PREVIEW_MAX_SIDE, 80), (thumb_path, THUMB_MAX_SIDE, 70)):
+                out = clean.copy()
+                out.thumbnail((side, side), Image.LANCZOS)
+                tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+                out.save(tmp, format="WEBP", quality=quality, method=4)
+                os.replace(tmp, path)
+        return preview_name, thumb_name
+
+    def _process(self, craft_id: int, outbox_id: int, embed, staged: list):
+        photos = []
+        try:
+            for src in staged:
+                try:
+                    digest = _sha256_file(src)
+                    preview, thumb = self._render(src, digest)
+                except Exception as e:
+                    print(f"INGEST: файл відхилено ({e})", flush=True)
+                    continue
+                if all(p[0] != digest for p in photos):
+                    photos.append((digest, preview, thumb))
+
+            if photos:
+                embed.set_image(url=f"attachment://{photos[0][1]}")
+            else:
+                embed.description += "\n_Нагадування: прошу прикріпити фото докази до повідомлення._"
+
+            with db.connect() as conn:
+                conn.executemany("""
+                    INSERT INTO craft_photos (craft_report_id, file_path, thumb_path, content_hash)
+                    VALUES (?, ?, ?, ?)
+                """, [(craft_id, f"{self.url_prefix}/{p}", f"{self.url_prefix}/{t}", d) for d, p, t in photos])
+                self.outbox.release(outbox_id, embed, [os.path.join(self.upload_dir, p) for _, p, _ in photos], conn)
+        except Exception as e:
+            print(f"INGEST: звіт #{craft_id} не оброблено: {e!r}", flush=True)
+        finally:
+            self.discard(staged)
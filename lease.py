@@ -0,0 +1,58 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+
+import db
+
+
+# ── Оренда ролі споживача (лідер серед процесів бота) ─────────────────────────
+# Outbox і планувальник оренд не мають захоплення рядків: два процеси бота
+# доставили б ті самі логи двічі. Тому працює лише власник рядка в leases
+# (audit.db): він продовжує строк кожні LEASE_TTL_SEC/3, решта процесів
+# чекають і перехоплюють оренду, коли строк спливе (власник упав / завис).
+
+LEASE_TTL_SEC = float(os.getenv("LEASE_TTL_SEC", 30))
+
+
+class Lease:
+    def __init__(self, name: str):
+        self.name = name
+        self.holder = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.held = False
+        self._task = None
+
+    def acquire(self) -> bool:
+        """Бере або продовжує оренду; False — її тримає інший живий процес."""
+        now = time.time()
+        with db.connect() as conn:
+            self.held = conn.execute("""
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE
+                    SET holder = excluded.holder, expires_at = excluded.expires_at
+                    WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+            """, (self.name, self.holder, now + LEASE_TTL_SEC, now)).rowcount > 0
+        return self.held
+
+    def release(self):
+        self.held = False
+        with db.connect() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+
+    # ── Продовження на loop бота ──
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            was = self.held
+            try:
+                await asyncio.to_thread(self.acquire)
+            except Exception as e:
+                self.held = False  # не змогли продовжити — вважаємо, що оренди немає
+                print(f"LEASE: {self.name}: {e!r}", flush=True)
+            if self.held != was:
+                print(f"LEASE: {self.name} {'отримано' if self.held else 'втрачено'} ({self.holder})", flush=True)
+            await asyncio.sleep(LEASE_TTL_SEC / 3)
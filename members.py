@@ -0,0 +1,82 @@
+import threading
+from bisect import bisect_left, insort
+
+
+# ── Довідник учасників гільдії ────────────────────────────────────────────────
+# Оновлюється інкрементально з подій бота (join/update/remove), читається з
+# Flask-потоків: пошук за id — O(1), пошук за префіксом імені — O(log n + k).
+
+class MemberDirectory:
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self._lock = threading.Lock()
+        self._by_id = {}          # id -> discord.Member (усі, включно з ботами)
+        self._keys = []           # відсортовані (display_name.casefold(), id) — лише не-боти
+        self._key_of = {}         # id -> його ключ у _keys
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._by_id)
+
+    # ── Запис (loop бота) ──
+    def load(self, guild):
+        by_id, key_of = {}, {}
+        for m in guild.members:
+            by_id[m.id] = m
+            if not m.bot:
+                key_of[m.id] = (m.display_name.casefold(), m.id)
+        with self._lock:
+            self._by_id = by_id
+            self._key_of = key_of
+            self._keys = sorted(key_of.values())
+
+    def upsert(self, member):
+        if member.guild.id != self.guild_id:
+            return
+        with self._lock:
+            self._by_id[member.id] = member
+            self._unindex(member.id)
+            if not member.bot:
+                key = (member.display_name.casefold(), member.id)
+                insort(self._keys, key)
+                self._key_of[member.id] = key
+
+    def remove(self, member):
+        if member.guild.id != self.guild_id:
+            return
+        with self._lock:
+            self._by_id.pop(member.id, None)
+            self._unindex(member.id)
+
+    def _unindex(self, member_id: int):
+        key = self._key_of.pop(member_id, None)
+        if key is not None:
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    # ── Читання (Flask) ──
+    def get(self, member_id):
+        try:
+            return self._by_id.get(int(member_id))
+        except (TypeError, ValueError):
+            return None
+
+    def search(self, prefix: str, limit: int = 20):
+        """До limit учасників, чиє ім'я починається з prefix (без урахування регістру)."""
+        prefix = (prefix or "").strip()
+        if prefix.isdigit():
+            m = self.get(prefix)
+            if m is not None and not m.bot:
+                return [(m.display_name, m.id)]
+        p = prefix.casefold()
+        out = []
+        with self._lock:
+            i = bisect_left(self._keys, (p,))
+            while i < len(self._keys) and len(out) < limit:
+                name_key, mid = self._keys[i]
+                if not name_key.startswith(p):
+                    break
+                out.append((self._by_id[mid].display_name, mid))
+                i += 1
+        return out
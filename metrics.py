@@ -0,0 +1,242 @@
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+import db
+
+
+# ── Метрики у форматі Prometheus ──────────────────────────────────────────────
+# Лічильники й гістограми в пам'яті процесу: запис — один lock і кілька
+# арифметичних операцій, тож на запит майже нічого не коштує. У RUN_MODE=web/bot
+# кожен процес раз на METRICS_PUBLISH_SEC кладе свої значення в metrics_snapshots
+# (audit.db), і /metrics у будь-якому веб-воркері віддає зведення всіх процесів
+# з міткою proc.
+
+METRICS_PUBLISH_SEC = float(os.getenv("METRICS_PUBLISH_SEC", 15))
+METRICS_STALE_SEC   = METRICS_PUBLISH_SEC * 4
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS   = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = []
+_local = threading.local()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _num(v) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, self.labelnames, labels, (), v) for labels, v in items]
+
+
+class Gauge(_Metric):
+    """Значення рахується під час збору: fn() → число (NaN/None — пропустити)."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def samples(self):
+        try:
+            v = self.fn()
+        except Exception:
+            return []
+        if v is None or (isinstance(v, float) and math.isnan(v)):
+            return []
+        return [(self.name, (), (), (), v)]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(s[0]), s[1], s[2]) for labels, s in self._values.items()]
+        out = []
+        for labels, counts, total, n in items:
+            acc = 0
+            for le, c in zip((*self.buckets, math.inf), counts):
+                acc += c
+                out.append((self.name + "_bucket", self.labelnames, labels, (("le", _num(le)),), acc))
+            out.append((self.name + "_sum", self.labelnames, labels, (), total))
+            out.append((self.name + "_count", self.labelnames, labels, (), n))
+        return out
+
+
+# ── Стандартні метрики застосунку ──
+http_requests = Counter("bcsd_http_requests_total", "HTTP requests", ("route", "method", "status"))
+http_latency = Histogram("bcsd_http_request_duration_seconds", "HTTP request latency", ("route",))
+http_db_queries = Histogram("bcsd_http_request_db_queries", "SQLite queries per HTTP request", ("route",), COUNT_BUCKETS)
+http_db_seconds = Histogram("bcsd_http_request_db_seconds", "SQLite time per HTTP request", ("route",))
+
+db_queries = Counter("bcsd_db_queries_total", "SQLite statements executed")
+db_query_seconds = Histogram("bcsd_db_query_duration_seconds", "SQLite statement execute time")
+
+discord_sends = Counter("bcsd_discord_send_total", "Discord channel sends by outcome", ("result",))
+discord_send_seconds = Histogram("bcsd_discord_send_duration_seconds", "Discord channel send latency")
+
+rate_limited = Counter("bcsd_rate_limited_total", "POST requests rejected by the per-user rate limiter", ("route",))
+
+
+# ── Облік SQL у межах запиту (db.py викликає record_query) ──
+def record_query(seconds: float):
+    db_queries.inc()
+    db_query_seconds.observe(seconds)
+    stats = getattr(_local, "request", None)
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+
+
+def begin_request():
+    # [запитів, час SQL, початок, HTTP-статус]
+    _local.request = [0, 0.0, time.perf_counter(), 500]
+
+
+def set_status(status: int):
+    stats = getattr(_local, "request", None)
+    if stats is not None:
+        stats[3] = status
+
+
+def end_request(route: str, method: str, failed: bool = False):
+    stats = getattr(_local, "request", None)
+    if stats is None:
+        return
+    _local.request = None
+    http_requests.inc(route, method, "500" if failed else str(stats[3]))
+    http_latency.observe(time.perf_counter() - stats[2], route)
+    http_db_queries.observe(stats[0], route)
+    http_db_seconds.observe(stats[1], route)
+
+
+# ── Експозиція ──
+def _collect(proc: str) -> dict:
+    """{метрика: [рядки семплів]} цього процесу з міткою proc."""
+    families = {}
+    for m in _registry:
+        lines = families.setdefault(m.name, [])
+        for name, names, values, extra, v in m.samples():
+            lines.append(f"{name}{_labels(names, values, (('proc', proc), *extra))} {_num(v)}")
+    return families
+
+
+def render(proc: str, others=()) -> str:
+    """Текстовий формат Prometheus: цей процес + знімки інших (список dict із _collect)."""
+    merged = _collect(proc)
+    for snapshot in others:
+        for name, lines in snapshot.items():
+            if name in merged:
+                merged[name].extend(lines)
+    out = []
+    for m in _registry:
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        out.extend(merged[m.name])
+    return "\n".join(out) + "\n"
+
+
+class Publisher:
+    """Періодично публікує метрики процесу в audit.db, щоб їх бачив /metrics інших процесів."""
+
+    def __init__(self, role: str):
+        self.role = role
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def proc(self) -> str:
+        return f"{self.role}-{os.getpid()}"
+
+    def ensure_started(self):
+        # після fork (воркери gunicorn) потоку в дочірньому процесі немає — стартуємо заново
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="metrics-publisher", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"METRICS: не вдалося опублікувати: {e!r}", flush=True)
+            time.sleep(METRICS_PUBLISH_SEC)
+
+    def publish(self):
+        body = json.dumps(_collect(self.proc), ensure_ascii=False)
+        with db.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO metrics_snapshots (proc, updated_at, body) VALUES (?, ?, ?)",
+                (self.proc, time.time(), body),
+            )
+            conn.execute("DELETE FROM metrics_snapshots WHERE updated_at < ?", (time.time() - METRICS_STALE_SEC,))
+
+    def others(self) -> list:
+        with db.connect() as conn:
+            rows = conn.execute(
+                "SELECT body FROM metrics_snapshots WHERE proc != ? AND updated_at >= ?",
+                (self.proc, time.time() - METRICS_STALE_SEC),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
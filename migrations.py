@@ -0,0 +1,378 @@
+import db
+
+
+# ── Міграції схеми audit.db ────────────────────────────────────────────────────
+# Версія схеми зберігається в PRAGMA user_version. Кожна міграція — (версія, [SQL]).
+# Нові міграції ТІЛЬКИ дописуються в кінець зі збільшеною версією; наявні не змінюємо.
+
+# таблиці, зміни яких інвалідовують кеш сторінок (v10; нові — окремою міграцією)
+VERSIONED_TABLES = ("actions", "vehicle_rentals", "exam_requests", "craft_reports", "promotion_reports")
+
+# джерела зведень активності (v13): таблиця → (вид, день, учасник, ім'я, ключ, величина);
+# вирази — над рядком new./old. тригера (префікс {r}) або над таблицею в заповненні
+ROLLUP_SOURCES = {
+    "actions": ("action", "COALESCE(substr({r}date, 1, 10), '')", "COALESCE({r}executor, '')",
+                "{r}executor", "COALESCE({r}action, '')", "0"),
+    "exam_requests": ("exam", "substr({r}submitted_at, 1, 10)", "{r}author_id", "{r}author_name",
+                      "{r}action_type", "0"),
+    "craft_reports": ("craft", "substr({r}submitted_at, 1, 10)", "{r}author_id", "{r}author_name",
+                      "''", "{r}total_cost"),
+    # оренда рахується при поверненні: години — на день повернення
+    "vehicle_rentals": ("rental", "substr({r}returned_at, 1, 10)", "{r}taken_by_id", "{r}taken_by_name",
+                        "{r}vehicle_id", "COALESCE((julianday({r}returned_at) - julianday({r}taken_at)) * 24, 0)"),
+}
+
+
+def _rollup_targets(table: str, row: str):
+    """величина + [(таблиця зведення, {ключові колонки: вираз}, (колонка підпису, вираз) | None)]."""
+    kind, *exprs = ROLLUP_SOURCES[table]
+    day, member, name, key, amount = (e.format(r=row) for e in exprs)
+    kind = f"'{kind}'"
+    return amount, [
+        ("activity_daily",        {"day": day, "kind": kind, "key": key},           None),
+        ("activity_member_daily", {"day": day, "kind": kind, "member": member},     ("member_name", name)),
+        ("activity_totals",       {"kind": kind, "dim": "'key'", "value": key},     None),
+        ("activity_totals",       {"kind": kind, "dim": "'member'", "value": member}, ("label", name)),
+    ]
+
+
+def _rollup_apply(table: str, row: str, sign: int) -> str:
+    amount, targets = _rollup_targets(table, row + ".")
+    out = []
+    for target, keys, label in targets:
+        if sign < 0:
+            where = " AND ".join(f"{col} = {expr}" for col, expr in keys.items())
+            out.append(f"UPDATE {target} SET events = events - 1, amount = amount - {amount} WHERE {where};")
+            continue
+        cols, values = [*keys, "events", "amount"], [*keys.values(), "1", amount]
+        update = "events = events + 1, amount = amount + excluded.amount"
+        if label:
+            cols.append(label[0])
+            values.append(label[1])
+            update += f", {label[0]} = excluded.{label[0]}"
+        out.append(
+            f"INSERT INTO {target} ({', '.join(cols)}) VALUES ({', '.join(values)})"
+            f" ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {update};"
+        )
+    return "\n".join(out)
+
+
+def _rollup_backfill(table: str) -> list:
+    amount, targets = _rollup_targets(table, "")
+    where = " WHERE returned_at IS NOT NULL" if table == "vehicle_rentals" else ""
+    out = []
+    for target, keys, label in targets:
+        cols = [*keys, "events", "amount"] + ([label[0]] if label else [])
+        values = [*keys.values(), "COUNT(*)", f"COALESCE(SUM({amount}), 0)"] + ([f"MAX({label[1]})"] if label else [])
+        out.append(
+            f"INSERT INTO {target} ({', '.join(cols)}) SELECT {', '.join(values)}"
+            f" FROM {table}{where} GROUP BY 1, 2, 3"
+        )
+    return out
+
+
+MIGRATIONS = [
+    (1, [
+        # /history: сортування за датою без повного скану
+        "CREATE INDEX IF NOT EXISTS idx_actions_date ON actions(date, id)",
+
+        # відкриті бронювання (returned_at IS NULL) — часткові індекси
+        """CREATE INDEX IF NOT EXISTS idx_rentals_open_vehicle
+           ON vehicle_rentals(vehicle_id) WHERE returned_at IS NULL""",
+        """CREATE INDEX IF NOT EXISTS idx_rentals_open_taken_at
+           ON vehicle_rentals(taken_at) WHERE returned_at IS NULL""",
+        """CREATE INDEX IF NOT EXISTS idx_rentals_open_user
+           ON vehicle_rentals(taken_by_id, taken_at) WHERE returned_at IS NULL""",
+
+        "CREATE INDEX IF NOT EXISTS idx_exam_requests_author ON exam_requests(author_id, submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_craft_reports_author ON craft_reports(author_id, submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_craft_photos_report ON craft_photos(craft_report_id)",
+    ]),
+    (2, [
+        # пошук по кадровому аудиту: фільтри по колонках + повнотекст по reason
+        "CREATE INDEX IF NOT EXISTS idx_actions_executor ON actions(executor, date, id)",
+        "CREATE INDEX IF NOT EXISTS idx_actions_target ON actions(target, date, id)",
+        "CREATE INDEX IF NOT EXISTS idx_actions_action ON actions(action, date, id)",
+        "CREATE INDEX IF NOT EXISTS idx_actions_role ON actions(role, date, id)",
+
+        """CREATE VIRTUAL TABLE IF NOT EXISTS actions_fts USING fts5(
+               reason, content='actions', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+           )""",
+        """CREATE TRIGGER IF NOT EXISTS actions_fts_ai AFTER INSERT ON actions BEGIN
+               INSERT INTO actions_fts(rowid, reason) VALUES (new.id, new.reason);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS actions_fts_ad AFTER DELETE ON actions BEGIN
+               INSERT INTO actions_fts(actions_fts, rowid, reason) VALUES ('delete', old.id, old.reason);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS actions_fts_au AFTER UPDATE OF reason ON actions BEGIN
+               INSERT INTO actions_fts(actions_fts, rowid, reason) VALUES ('delete', old.id, old.reason);
+               INSERT INTO actions_fts(rowid, reason) VALUES (new.id, new.reason);
+           END""",
+        # наявні записи
+        "INSERT INTO actions_fts(actions_fts) VALUES ('rebuild')",
+    ]),
+    (3, [
+        # надійна черга логів у Discord (див. outbox.py)
+        """CREATE TABLE IF NOT EXISTS outbox (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               channel_id   INTEGER NOT NULL,
+               payload      TEXT NOT NULL,
+               created_at   TEXT NOT NULL,
+               delivered_at TEXT,
+               failed_at    TEXT,
+               attempts     INTEGER NOT NULL DEFAULT 0,
+               last_error   TEXT
+           )""",
+        """CREATE INDEX IF NOT EXISTS idx_outbox_pending
+           ON outbox(id) WHERE delivered_at IS NULL AND failed_at IS NULL""",
+        "CREATE INDEX IF NOT EXISTS idx_outbox_delivered ON outbox(delivered_at) WHERE delivered_at IS NOT NULL",
+    ]),
+    (4, [
+        # дзеркало гільдії для веб-воркерів в окремих процесах (див. guild_sync.py)
+        """CREATE TABLE IF NOT EXISTS guild_roles (
+               id   INTEGER PRIMARY KEY,
+               name TEXT NOT NULL
+           )""",
+        """CREATE TABLE IF NOT EXISTS guild_members (
+               id           INTEGER PRIMARY KEY,
+               display_name TEXT NOT NULL,
+               is_bot       INTEGER NOT NULL,
+               role_ids     TEXT NOT NULL
+           )""",
+        """CREATE TABLE IF NOT EXISTS guild_sync (
+               id      INTEGER PRIMARY KEY CHECK (id = 1),
+               version INTEGER NOT NULL
+           )""",
+        "INSERT OR IGNORE INTO guild_sync (id, version) VALUES (1, 0)",
+    ]),
+    (5, [
+        # outbox: відкладені записи (чекають обробки фото) і файли-вкладення
+        "ALTER TABLE outbox ADD COLUMN held INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE outbox ADD COLUMN files TEXT",
+        # фото крафту: мініатюра та хеш вмісту для дедуплікації
+        "ALTER TABLE craft_photos ADD COLUMN thumb_path TEXT",
+        "ALTER TABLE craft_photos ADD COLUMN content_hash TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_craft_photos_hash ON craft_photos(content_hash)",
+    ]),
+    (6, [
+        # звіти на підвищення SAI / SA / SPD
+        """CREATE TABLE IF NOT EXISTS promotion_reports (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               department   TEXT NOT NULL,
+               author_id    TEXT NOT NULL,
+               author_name  TEXT NOT NULL,
+               rank_from    TEXT NOT NULL,
+               rank_to      TEXT NOT NULL,
+               report       TEXT NOT NULL,
+               submitted_at TEXT NOT NULL
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_promo_date ON promotion_reports(submitted_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_promo_department ON promotion_reports(department, submitted_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_promo_author_id ON promotion_reports(author_id, submitted_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_promo_author_name ON promotion_reports(author_name, submitted_at, id)",
+    ]),
+    (7, [
+        # строки оренди транспорту: due_at — коли повернути, remind_at — коли нагадати
+        # (NULL після нагадування), overdue_at — коли позначено простроченим
+        "ALTER TABLE vehicle_rentals ADD COLUMN due_at TEXT",
+        "ALTER TABLE vehicle_rentals ADD COLUMN remind_at TEXT",
+        "ALTER TABLE vehicle_rentals ADD COLUMN overdue_at TEXT",
+        """CREATE INDEX IF NOT EXISTS idx_rentals_open_due ON vehicle_rentals(due_at)
+           WHERE returned_at IS NULL AND overdue_at IS NULL""",
+        """CREATE INDEX IF NOT EXISTS idx_rentals_open_remind ON vehicle_rentals(remind_at)
+           WHERE returned_at IS NULL AND remind_at IS NOT NULL""",
+        "CREATE INDEX IF NOT EXISTS idx_rentals_taken_at ON vehicle_rentals(taken_at)",
+    ]),
+    (8, [
+        # одне авто — не більше однієї відкритої оренди. Дублікати, що могли з'явитися
+        # через гонку в старому коді, закриваються (лишається найперша оренда)
+        """UPDATE vehicle_rentals SET returned_at = taken_at
+           WHERE returned_at IS NULL
+             AND id NOT IN (SELECT MIN(id) FROM vehicle_rentals WHERE returned_at IS NULL GROUP BY vehicle_id)""",
+        "DROP INDEX IF EXISTS idx_rentals_open_vehicle",
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_rentals_open_vehicle
+           ON vehicle_rentals(vehicle_id) WHERE returned_at IS NULL""",
+
+        # ключі ідемпотентності POST-форм: status IS NULL — запит ще виконується
+        """CREATE TABLE IF NOT EXISTS idempotency_keys (
+               user_id    TEXT NOT NULL,
+               key        TEXT NOT NULL,
+               endpoint   TEXT NOT NULL,
+               created_at TEXT NOT NULL,
+               status     INTEGER,
+               location   TEXT,
+               PRIMARY KEY (user_id, key)
+           ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_idempotency_created ON idempotency_keys(created_at)",
+    ]),
+    (9, [
+        # останні значення метрик кожного процесу (web-воркери, бот) для /metrics
+        """CREATE TABLE IF NOT EXISTS metrics_snapshots (
+               proc       TEXT PRIMARY KEY,
+               updated_at REAL NOT NULL,
+               body       TEXT NOT NULL
+           )""",
+    ]),
+    (10, [
+        # лічильники змін таблиць — ключ кешу сторінок і ETag (див. pagecache.py)
+        """CREATE TABLE IF NOT EXISTS data_versions (
+               name    TEXT PRIMARY KEY,
+               version INTEGER NOT NULL DEFAULT 0
+           ) WITHOUT ROWID""",
+        *(f"INSERT OR IGNORE INTO data_versions (name) VALUES ('{t}')" for t in VERSIONED_TABLES),
+        *(
+            f"""CREATE TRIGGER IF NOT EXISTS {t}_version_{op.lower()} AFTER {op} ON {t} BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE name = '{t}';
+                END"""
+            for t in VERSIONED_TABLES for op in ("INSERT", "UPDATE", "DELETE")
+        ),
+    ]),
+    (11, [
+        # денний підсумок матеріалів на крафт (див. quota.py) + заповнення з наявних звітів
+        """CREATE TABLE IF NOT EXISTS craft_quota (
+               author_id TEXT NOT NULL,
+               day       TEXT NOT NULL,
+               used      REAL NOT NULL DEFAULT 0,
+               reports   INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (author_id, day)
+           ) WITHOUT ROWID""",
+        """INSERT OR IGNORE INTO craft_quota (author_id, day, used, reports)
+           SELECT author_id, substr(submitted_at, 1, 10), SUM(total_cost), COUNT(*)
+           FROM craft_reports
+           GROUP BY author_id, substr(submitted_at, 1, 10)""",
+    ]),
+    (12, [
+        # позиції крафт-звітів окремими рядками (див. craft_stats.py) + перенесення з items_json
+        """CREATE TABLE IF NOT EXISTS craft_report_items (
+               id           INTEGER PRIMARY KEY AUTOINCREMENT,
+               report_id    INTEGER NOT NULL REFERENCES craft_reports(id) ON DELETE CASCADE,
+               item         TEXT NOT NULL,
+               qty          INTEGER NOT NULL,
+               unit_cost    REAL NOT NULL,
+               cost         REAL NOT NULL,
+               is_weapon    INTEGER NOT NULL DEFAULT 0,
+               author_id    TEXT NOT NULL,
+               submitted_at TEXT NOT NULL
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_craft_items_report ON craft_report_items(report_id)",
+        "CREATE INDEX IF NOT EXISTS idx_craft_items_item ON craft_report_items(item, submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_craft_items_author ON craft_report_items(author_id, submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_craft_items_date ON craft_report_items(submitted_at)",
+        """INSERT INTO craft_report_items
+               (report_id, item, qty, unit_cost, cost, is_weapon, author_id, submitted_at)
+           SELECT r.id, json_extract(j.value, '$.key'), json_extract(j.value, '$.qty'),
+                  json_extract(j.value, '$.unit_cost'), json_extract(j.value, '$.cost'),
+                  COALESCE(json_extract(j.value, '$.is_weapon'), 0), r.author_id, r.submitted_at
+           FROM craft_reports r, json_each(r.items_json) j
+           WHERE json_valid(r.items_json) AND json_extract(j.value, '$.key') IS NOT NULL""",
+    ]),
+    (13, [
+        # зведення активності (див. stats.py): по днях і ключах, по днях і учасниках,
+        # за весь час. Тригери оновлюють кілька рядків на кожен запис; /stats читає
+        # лише зведення — обсяг залежить від довжини періоду, а не від історії
+        """CREATE TABLE IF NOT EXISTS activity_daily (
+               day    TEXT NOT NULL,
+               kind   TEXT NOT NULL,
+               key    TEXT NOT NULL,
+               events INTEGER NOT NULL DEFAULT 0,
+               amount REAL NOT NULL DEFAULT 0,
+               PRIMARY KEY (day, kind, key)
+           ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS activity_member_daily (
+               day         TEXT NOT NULL,
+               kind        TEXT NOT NULL,
+               member      TEXT NOT NULL,
+               member_name TEXT,
+               events      INTEGER NOT NULL DEFAULT 0,
+               amount      REAL NOT NULL DEFAULT 0,
+               PRIMARY KEY (day, kind, member)
+           ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS activity_totals (
+               kind   TEXT NOT NULL,
+               dim    TEXT NOT NULL,
+               value  TEXT NOT NULL,
+               label  TEXT,
+               events INTEGER NOT NULL DEFAULT 0,
+               amount REAL NOT NULL DEFAULT 0,
+               PRIMARY KEY (kind, dim, value)
+           ) WITHOUT ROWID""",
+        *(sql for t in ROLLUP_SOURCES for sql in _rollup_backfill(t)),
+        *(
+            f"""CREATE TRIGGER IF NOT EXISTS {t}_rollup_{op.lower()} AFTER {op} ON {t} BEGIN
+                    {_rollup_apply(t, "new" if op == "INSERT" else "old", +1 if op == "INSERT" else -1)}
+                END"""
+            for t in ("actions", "exam_requests", "craft_reports") for op in ("INSERT", "DELETE")
+        ),
+        f"""CREATE TRIGGER IF NOT EXISTS vehicle_rentals_rollup_return AFTER UPDATE OF returned_at ON vehicle_rentals
+            WHEN old.returned_at IS NULL AND new.returned_at IS NOT NULL BEGIN
+                {_rollup_apply("vehicle_rentals", "new", +1)}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS vehicle_rentals_rollup_delete AFTER DELETE ON vehicle_rentals
+            WHEN old.returned_at IS NOT NULL BEGIN
+                {_rollup_apply("vehicle_rentals", "old", -1)}
+            END""",
+    ]),
+    (14, [
+        # серверні сесії: у cookie лише id (див. sessions.py)
+        """CREATE TABLE IF NOT EXISTS sessions (
+               id         TEXT PRIMARY KEY,
+               user_id    TEXT NOT NULL,
+               data       TEXT NOT NULL,
+               created_at REAL NOT NULL,
+               expires_at REAL NOT NULL
+           ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)",
+    ]),
+    (15, [
+        # сесії переїхали в окремий sessions.db (див. sessions.py): у знімку audit.db їм не місце
+        "DROP TABLE IF EXISTS sessions",
+    ]),
+    (16, [
+        # хто з процесів бота доставляє outbox і нагадування (див. lease.py)
+        """CREATE TABLE IF NOT EXISTS leases (
+               name       TEXT PRIMARY KEY,
+               holder     TEXT NOT NULL,
+               expires_at REAL NOT NULL
+           ) WITHOUT ROWID""",
+    ]),
+    (17, [
+        # outbox: тимчасові збої Discord — повтор із паузою, а не failed_at (див. outbox.py)
+        "ALTER TABLE outbox ADD COLUMN retry_at TEXT",
+        # повернути в чергу записи, які раніше "провалились" через тимчасовий збій
+        """UPDATE outbox SET failed_at = NULL
+           WHERE failed_at IS NOT NULL AND delivered_at IS NULL
+             AND last_error IN ('channel unavailable', 'retries exhausted')""",
+    ]),
+    (18, [
+        # завантаженість автопарку: закриті оренди, що закінчились у вікні (див. rentals.fleet_utilization)
+        "CREATE INDEX IF NOT EXISTS idx_rentals_returned_at ON vehicle_rentals(returned_at) WHERE returned_at IS NOT NULL",
+    ]),
+]
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations():
+    """Накатує всі нові міграції. Ідемпотентно: застосовані версії пропускаються."""
+    with db.connect() as conn:
+        for version, statements in MIGRATIONS:
+            if schema_version(conn) >= version:
+                continue
+            # IMMEDIATE: одночасний старт кількох процесів не накатить міграцію двічі
+            conn.execute("BEGIN IMMEDIATE")
+            applied = False
+            try:
+                if schema_version(conn) < version:
+                    for sql in statements:
+                        conn.execute(sql)
+                    conn.execute(f"PRAGMA user_version={version}")
+                    applied = True
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if applied:
+                print(f"DB: migrated to schema v{version}", flush=True)
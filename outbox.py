@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import discord
+
+import db
+import metrics
+
+
+# ── Черга логів у Discord ─────────────────────────────────────────────────────
+# Ембеди пишуться в таблицю outbox (audit.db) тією ж транзакцією, що й бізнес-запис,
+# тож падіння процесу між commit і відправкою нічого не губить. Відправляє один
+# споживач на event loop бота (з кількох процесів бота — лише власник оренди,
+# див. lease.py): групує сплески в повідомлення до 10 ембедів,
+# чекає при 429, повторює при 5xx і позначає доставлені записи. Якщо Discord
+# недоступний довше (5xx / 429 / мережа) — запис лишається в черзі й повторюється
+# з наростаючою паузою (attempts → retry_at); failed_at ставиться лише при
+# остаточній відмові (403/404 та інші 4xx, крім 429).
+
+OUTBOX_BATCH        = int(os.getenv("OUTBOX_BATCH", 500))
+OUTBOX_COALESCE_SEC = float(os.getenv("OUTBOX_COALESCE_MS", 300)) / 1000
+OUTBOX_POLL_SEC     = float(os.getenv("OUTBOX_POLL_SEC", 5))
+OUTBOX_MAX_RETRIES  = int(os.getenv("OUTBOX_MAX_RETRIES", 5))
+OUTBOX_KEEP_DAYS    = int(os.getenv("OUTBOX_KEEP_DAYS", 7))
+OUTBOX_HOLD_MAX_SEC = int(os.getenv("OUTBOX_HOLD_MAX_SEC", 600))
+OUTBOX_BACKOFF_SEC  = float(os.getenv("OUTBOX_BACKOFF_SEC", 30))
+OUTBOX_BACKOFF_MAX  = float(os.getenv("OUTBOX_BACKOFF_MAX_SEC", 3600))
+
+MAX_EMBEDS_PER_MESSAGE = 10    # ліміт Discord
+MAX_EMBED_CHARS_TOTAL  = 6000  # сумарний ліміт тексту ембедів в одному повідомленні
+
+
+def _utcnow() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _permanent(e: discord.HTTPException) -> bool:
+    # повтор не допоможе: немає доступу / каналу / некоректний запит
+    return 400 <= e.status < 500 and e.status != 429
+
+
+def _chunks(jobs):
+    # ріже список (id, embed, files, attempts) на повідомлення з урахуванням обох лімітів Discord;
+    # записи з файлами йдуть окремими повідомленнями
+    batch, size = [], 0
+    for job in jobs:
+        if job[2]:
+            if batch:
+                yield batch
+                batch, size = [], 0
+            yield [job]
+            continue
+        n = len(job[1])
+        if batch and (len(batch) >= MAX_EMBEDS_PER_MESSAGE or size + n > MAX_EMBED_CHARS_TOTAL):
+            yield batch
+            batch, size = [], 0
+        batch.append(job)
+        size += n
+    if batch:
+        yield batch
+
+
+class Outbox:
+    def __init__(self, bot, lease=None):
+        self.bot = bot
+        self.lease = lease
+        self._loop = None
+        self._wake = None
+        self._task = None
+
+    # ── API для Flask-потоків ──
+    def send(self, channel_id: int, embed: discord.Embed, conn=None, held: bool = False) -> int:
+        """Ставить ембед у чергу. З conn — у тій самій транзакції, що й бізнес-запис.
+
+        held=True — запис чекає release() (напр. поки обробляються фото); якщо
+        release() так і не настане, через OUTBOX_HOLD_MAX_SEC лист піде як є.
+        """
+        row = (channel_id, json.dumps(embed.to_dict(), ensure_ascii=False), _utcnow(), int(held))
+        sql = "INSERT INTO outbox (channel_id, payload, created_at, held) VALUES (?, ?, ?, ?)"
+        if conn is not None:
+            outbox_id = conn.execute(sql, row).lastrowid
+        else:
+            with db.connect() as own:
+                outbox_id = own.execute(sql, row).lastrowid
+        if not held:
+            self.kick()
+        return outbox_id
+
+    def release(self, outbox_id: int, embed: discord.Embed, files, conn):
+        """Оновлює відкладений запис (ембед + шляхи до файлів-вкладень) і дозволяє відправку."""
+        conn.execute(
+            "UPDATE outbox SET payload=?, files=?, held=0 WHERE id=?",
+            (json.dumps(embed.to_dict(), ensure_ascii=False), json.dumps(files) if files else None, outbox_id),
+        )
+        self.kick()
+
+    def kick(self):
+        # розбудити споживача (потокобезпечно); якщо бот в іншому процесі — спрацює опитування
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def depth(self) -> int:
+        with db.connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE delivered_at IS NULL AND failed_at IS NULL"
+            ).fetchone()[0]
+
+    # ── Споживач на loop бота ──
+    def start(self):
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._wake.set()  # дослати те, що лишилось із попереднього запуску
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=OUTBOX_POLL_SEC)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self.lease is not None and not self.lease.held:
+                continue  # доставляє інший процес бота
+            await asyncio.sleep(OUTBOX_COALESCE_SEC)  # даємо сплеску зібратися
+            try:
+                while await self._drain_once():
+                    pass
+            except Exception as e:
+                print(f"OUTBOX: помилка відправки: {e!r}", flush=True)
+
+    def _fetch_pending(self):
+        with db.connect() as conn:
+            return conn.execute("""
+                SELECT id, channel_id, payload, files, attempts FROM outbox
+                WHERE delivered_at IS NULL AND failed_at IS NULL
+                  AND (held = 0 OR created_at < datetime('now', ?))
+                  AND (retry_at IS NULL OR retry_at <= datetime('now'))
+                ORDER BY id
+                LIMIT ?
+            """, (f"-{OUTBOX_HOLD_MAX_SEC} seconds", OUTBOX_BATCH)).fetchall()
+
+    def _mark(self, ids, column: str, error: str = None):
+        now = _utcnow()
+        with db.connect() as conn:
+            conn.executemany(
+                f"UPDATE outbox SET {column}=?, attempts=attempts+1, last_error=? WHERE id=?",
+                [(now, error, i) for i in ids],
+            )
+
+    def _defer(self, jobs, error: str):
+        # тимчасова помилка: лишаємо в черзі, наступна спроба — через 30 с, 1 хв, 2 хв ... ≤ 1 год
+        with db.connect() as conn:
+            conn.executemany(
+                "UPDATE outbox SET attempts=attempts+1, last_error=?, retry_at=datetime('now', ?) WHERE id=?",
+                [(error, f"+{int(min(OUTBOX_BACKOFF_SEC * 2 ** min(job[3], 16), OUTBOX_BACKOFF_MAX))} seconds", job[0])
+                 for job in jobs],
+            )
+        print(f"OUTBOX: {len(jobs)} запис(ів) відкладено: {error}", flush=True)
+
+    def _prune(self):
+        with db.connect() as conn:
+            conn.execute(
+                "DELETE FROM outbox WHERE delivered_at < datetime('now', ?)",
+                (f"-{OUTBOX_KEEP_DAYS} days",),
+            )
+
+    async def _drain_once(self) -> bool:
+        rows = await asyncio.to_thread(self._fetch_pending)
+        if not rows:
+            return False
+
+        by_channel = {}
+        for oid, channel_id, payload, files, attempts in rows:
+            embed = discord.Embed.from_dict(json.loads(payload))
+            by_channel.setdefault(channel_id, []).append((oid, embed, json.loads(files) if files else [], attempts))
+
+        # канали незалежні: 429 в одному не гальмує інші
+        results = await asyncio.gather(
+            *(self._flush(cid, jobs) for cid, jobs in by_channel.items()),
+            return_exceptions=True,
+        )
+        for r in results:
+            if isinstance(r, Exception):
+                print(f"OUTBOX: помилка відправки: {r!r}", flush=True)
+
+        await asyncio.to_thread(self._prune)
+        return len(rows) == OUTBOX_BATCH
+
+    async def _resolve_channel(self, channel_id: int):
+        """(канал, None) або (None, (текст помилки, остаточна?))."""
+        ch = self.bot.get_channel(channel_id)
+        if ch is not None:
+            return ch, None
+        try:
+            return await self.bot.fetch_channel(channel_id), None
+        except discord.HTTPException as e:
+            print(f"OUTBOX: канал {channel_id} недоступний: {e}", flush=True)
+            return None, (f"channel unavailable: {e}", _permanent(e))
+        except (OSError, asyncio.TimeoutError) as e:
+            return None, (f"channel unavailable: {e!r}", False)
+
+    async def _flush(self, channel_id: int, jobs):
+        ch, failure = await self._resolve_channel(channel_id)
+        if ch is None:
+            await self._settle(jobs, failure)
+            return
+        for batch in _chunks(jobs):
+            failure = await self._send_with_retry(ch, [job[1] for job in batch], batch[0][2])
+            await self._settle(batch, failure)
+
+    async def _settle(self, jobs, failure):
+        if failure is None:
+            await asyncio.to_thread(self._mark, [job[0] for job in jobs], "delivered_at")
+        elif failure[1]:
+            await asyncio.to_thread(self._mark, [job[0] for job in jobs], "failed_at", failure[0])
+        else:
+            await asyncio.to_thread(self._defer, jobs, failure[0])
+
+    async def _send_with_retry(self, ch, embeds, files=()):
+        # None — доставлено; інакше (текст помилки, остаточна?)
+        delay = 1.0
+        for attempt in range(1, OUTBOX_MAX_RETRIES + 1):
+            try:
+                # discord.File одноразовий — на кожну спробу відкриваємо заново
+                attachments = [discord.File(p, filename=os.path.basename(p)) for p in files if os.path.exists(p)]
+                started = time.perf_counter()
+                await ch.send(embeds=embeds, files=attachments)
+                metrics.discord_send_seconds.observe(time.perf_counter() - started)
+                metrics.discord_sends.inc("ok")
+                return None
+            except discord.HTTPException as e:
+                if _permanent(e):
+                    metrics.discord_sends.inc("rejected")
+                    print(f"OUTBOX: відправка в {ch.id} відхилена: {e}", flush=True)
+                    return str(e), True
+                metrics.discord_sends.inc("rate_limited" if e.status == 429 else "server_error")
+                retry_after = getattr(e, "retry_after", None) or delay
+                print(f"OUTBOX: {e.status} для {ch.id}, повтор через {retry_after:.1f}s ({attempt}/{OUTBOX_MAX_RETRIES})", flush=True)
+                await asyncio.sleep(retry_after)
+                delay = min(delay * 2, 60)
+        metrics.discord_sends.inc("exhausted")
+        print(f"OUTBOX: {len(embeds)} ембед(ів) для {ch.id} не доставлено — повтор пізніше", flush=True)
+        return "retries exhausted", False
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import Response, request, session
+
+import db
+
+try:
+    import brotli
+except ImportError:  # необов'язково: без пакета — лише gzip
+    brotli = None
+
+
+# ── Кеш сторінок + умовні відповіді + стиснення ───────────────────────────────
+# ETag сторінки = хеш (маршрут, URL із параметрами, користувач, версії таблиць,
+# від яких вона залежить, відбиток шаблонів). Версії таблиць рахують тригери
+# (data_versions, див. migrations.py v10), тож ETag можна порахувати одним
+# дрібним запитом — без рендеру. Збіг If-None-Match → 304; збіг у пам'яті →
+# готові (і вже стиснуті) байти; промах → рендер, і результат кладеться в кеш.
+
+PAGE_CACHE_MAX       = int(os.getenv("PAGE_CACHE_MAX", 512))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_MB", 32)) * 1024 * 1024
+COMPRESS_MIN_BYTES   = 1024
+GZIP_LEVEL           = 6
+BROTLI_QUALITY       = 5
+
+COMPRESSIBLE = ("text/", "application/json", "application/javascript", "application/x-ndjson", "image/svg+xml")
+PAGE_CACHE_CONTROL = "private, no-cache"  # щоразу перевіряти, але тіло брати з кешу браузера
+
+
+def _gzip(data: bytes) -> bytes:
+    gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return gz.compress(data) + gz.flush()
+
+
+def _encode(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return _gzip(data)
+
+
+def negotiate_encoding():
+    """'br' / 'gzip' / None — за Accept-Encoding поточного запиту."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(resp):
+    """after_request: стискає звичайні (не потокові) текстові відповіді."""
+    if (
+        resp.direct_passthrough
+        or resp.is_streamed
+        or resp.status_code != 200
+        or "Content-Encoding" in resp.headers
+        or not (resp.mimetype or "").startswith(COMPRESSIBLE)
+    ):
+        return resp
+    resp.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding()
+    data = resp.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_BYTES:
+        return resp
+    resp.set_data(_encode(data, encoding))
+    resp.headers["Content-Encoding"] = encoding
+    return resp
+
+
+class _Entry:
+    __slots__ = ("body", "encoded")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.encoded = {}
+
+    def size(self) -> int:
+        return len(self.body) + sum(len(v) for v in self.encoded.values())
+
+
+class PageCache:
+    def __init__(self, template_dir: str, static_dir: str):
+        self.template_dir = template_dir
+        self.static_dir = static_dir
+        self._fingerprint = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # ── Ключ ──
+    def fingerprint(self) -> str:
+        # шаблони + маніфест фонів: після деплою старі ETag браузерів не збігаються
+        if self._fingerprint is None:
+            h = hashlib.sha1()
+            paths = [os.path.join(self.template_dir, n) for n in sorted(os.listdir(self.template_dir))]
+            paths.append(os.path.join(self.static_dir, "build", "manifest.json"))
+            for path in paths:
+                try:
+                    with open(path, "rb") as f:
+                        h.update(f.read())
+                except OSError:
+                    pass
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    @staticmethod
+    def versions(tables) -> tuple:
+        if not tables:
+            return ()
+        with db.connect() as conn:
+            rows = conn.execute(
+                f"SELECT name, version FROM data_versions WHERE name IN ({','.join('?' * len(tables))})",
+                tuple(tables),
+            ).fetchall()
+        return tuple(sorted(rows))
+
+    def etag(self, tables, extra=()) -> str:
+        user = session.get("user") or {}
+        parts = (
+            self.fingerprint(), request.endpoint, request.full_path,
+            user.get("id"), user.get("username"), self.versions(tables), *extra,
+        )
+        return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+    # ── Сховище (LRU) ──
+    def _get(self, tag: str):
+        with self._lock:
+            entry = self._entries.get(tag)
+            if entry is not None:
+                self._entries.move_to_end(tag)
+            return entry
+
+    def _put(self, tag: str, body: bytes) -> _Entry:
+        entry = _Entry(body)
+        with self._lock:
+            old = self._entries.pop(tag, None)
+            if old is not None:
+                self._bytes -= old.size()
+            self._entries[tag] = entry
+            self._bytes += entry.size()
+            self._evict()
+        return entry
+
+    def _encoded(self, entry: _Entry, encoding: str) -> bytes:
+        data = entry.encoded.get(encoding)
+        if data is None:
+            data = _encode(entry.body, encoding)
+            with self._lock:
+                if encoding not in entry.encoded:
+                    entry.encoded[encoding] = data
+                    self._bytes += len(data)
+                    self._evict()
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > PAGE_CACHE_MAX or self._bytes > PAGE_CACHE_MAX_BYTES):
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.size()
+
+    # ── Відповідь ──
+    def _headers(self, resp, tag: str):
+        # слабкий ETag: той самий вміст іде як identity / gzip / br — побайтно це різні тіла.
+        # Last-Modified не шлемо: версії таблиць — лічильники, а не час, і перевірка лише за ETag
+        resp.set_etag(tag, weak=True)
+        resp.headers["Cache-Control"] = PAGE_CACHE_CONTROL
+        resp.vary.update(("Accept-Encoding", "Cookie"))
+        return resp
+
+    def respond(self, tables, render, extra=()):
+        """tables — таблиці, від яких залежить сторінка; render() → str або генератор (stream_template)."""
+        tag = self.etag(tables, extra)
+        entry = self._get(tag)
+
+        if request.if_none_match.contains_weak(tag):
+            return self._headers(Response(status=304), tag)
+
+        encoding = negotiate_encoding()
+        if entry is None:
+            out = render()
+            if isinstance(out, (str, bytes)):
+                entry = self._put(tag, out.encode("utf-8") if isinstance(out, str) else out)
+            else:
+                # потокове стиснення — лише gzip, і лише якщо клієнт його приймає
+                gzip = bool(request.accept_encodings["gzip"])
+                resp = Response(self._tee(tag, out, gzip), mimetype="text/html")
+                if gzip:
+                    resp.headers["Content-Encoding"] = "gzip"
+                return self._headers(resp, tag)
+
+        body = self._encoded(entry, encoding) if encoding and len(entry.body) >= COMPRESS_MIN_BYTES else entry.body
+        resp = Response(body, mimetype="text/html")
+        if body is not entry.body:
+            resp.headers["Content-Encoding"] = encoding
+        return self._headers(resp, tag)
+
+    def _tee(self, tag: str, chunks, gzip: bool):
+        # потоковий рендер (перша сторінка доходить одразу) + копія в кеш після завершення;
+        # на промаху стискаємо gzip потоково — brotli лише для вже закешованих сторінок
+        gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if gzip else None
+        parts = []
+        for chunk in chunks:
+            data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            parts.append(data)
+            yield gz.compress(data) + gz.flush(zlib.Z_SYNC_FLUSH) if gz else data
+        if gz:
+            yield gz.flush()
+        self._put(tag, b"".join(parts))
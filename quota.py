@@ -0,0 +1,41 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import db
+
+
+# ── Денний ліміт матеріалів на крафт ──────────────────────────────────────────
+# craft_quota тримає наростаючий підсумок на (учасник, день за Києвом). Звіт
+# списує свою суму умовним upsert у тій самій транзакції, що й INSERT звіту:
+# перевірка й оновлення — один рядок за первинним ключем, скільки б звітів не
+# накопичилось у craft_reports.
+
+KYIV = ZoneInfo("Europe/Kyiv")
+
+
+def day_key(now: datetime = None) -> str:
+    return (now or datetime.now(KYIV)).strftime("%Y-%m-%d")
+
+
+def used(author_id: str, day: str = None) -> float:
+    with db.connect() as conn:
+        row = conn.execute(
+            "SELECT used FROM craft_quota WHERE author_id = ? AND day = ?",
+            (str(author_id), day or day_key()),
+        ).fetchone()
+    return row[0] if row else 0
+
+
+def charge(conn, author_id: str, day: str, amount: float, cap: float):
+    """Списує amount з денного ліміту в транзакції conn. Повертає нове "використано"
+    за день або None — ліміт було б перевищено."""
+    if amount > cap:
+        return None
+    row = conn.execute("""
+        INSERT INTO craft_quota (author_id, day, used, reports) VALUES (?, ?, ?, 1)
+        ON CONFLICT (author_id, day) DO UPDATE
+            SET used = used + excluded.used, reports = reports + 1
+            WHERE craft_quota.used + excluded.used <= ?
+        RETURNING used
+    """, (str(author_id), day, amount, cap)).fetchone()
+    return row[0] if row else None
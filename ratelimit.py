@@ -0,0 +1,111 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, request, session
+
+import metrics
+
+
+# ── Обмеження частоти POST-запитів ────────────────────────────────────────────
+# Token bucket на (користувач, маршрут): ємність N запитів, поповнення N за
+# period секунд. Перевірка — пошук у словнику й кілька арифметичних дій; стан
+# обмежений RATE_LIMIT_MAX_KEYS (найдавніше використані відра витісняються —
+# вони й так майже повні). Ліміт — на процес: з кількома воркерами gunicorn
+# фактична межа пропорційно більша, але один користувач однаково не забиває
+# писача БД і бюджет Discord. Перевірка йде першою — до читання тіла запиту
+# та будь-яких записів у БД, тож відхилений /craft не приймає 25 МБ фото.
+# Повтор уже виконаної форми (@idempotent нижче віддає збережену відповідь)
+# токен повертає — подвійний клік чи ретрай проксі ліміт не з'їдають.
+
+RATE_LIMIT_DEFAULT  = os.getenv("RATE_LIMIT_DEFAULT", "10/60")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 10000))
+
+# endpoint → "запитів/секунд"; RATE_LIMITS="craft_report=2/60,dashboard=30/60" перевизначає
+RATE_LIMITS = {
+    "dashboard":       "20/60",
+    "vehicles_take":   "6/60",
+    "vehicles_return": "6/60",
+    "exam_request":    "3/60",
+    "craft_report":    "3/60",
+    "sai_report":      "3/60",
+    "sa_report":       "3/60",
+    "spd_report":      "3/60",
+}
+
+
+def _parse(spec: str):
+    count, _, period = spec.partition("/")
+    count = max(int(count), 1)
+    return count, count / float(period or 60)  # (ємність, токенів за секунду)
+
+
+def _load_limits():
+    limits = dict(RATE_LIMITS)
+    for part in os.getenv("RATE_LIMITS", "").split(","):
+        endpoint, _, spec = part.strip().partition("=")
+        if endpoint and spec:
+            limits[endpoint] = spec.strip()
+    return {endpoint: _parse(spec) for endpoint, spec in limits.items()}
+
+
+class TokenBuckets:
+    def __init__(self):
+        self.limits = _load_limits()
+        self.default = _parse(RATE_LIMIT_DEFAULT)
+        self._buckets = OrderedDict()  # (user, endpoint) -> [токени, час оновлення]
+        self._lock = threading.Lock()
+
+    def take(self, user: str, endpoint: str) -> float:
+        """0 — запит пропущено; інакше — через скільки секунд з'явиться токен."""
+        capacity, rate = self.limits.get(endpoint, self.default)
+        key = (user, endpoint)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, now]
+                if len(self._buckets) > RATE_LIMIT_MAX_KEYS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / rate
+
+    def refund(self, user: str, endpoint: str):
+        capacity, _ = self.limits.get(endpoint, self.default)
+        with self._lock:
+            bucket = self._buckets.get((user, endpoint))
+            if bucket is not None:
+                bucket[0] = min(capacity, bucket[0] + 1)
+
+
+buckets = TokenBuckets()
+
+
+def rate_limited(view):
+    """Декоратор для обробників із POST: понад ліміт — 429 з Retry-After, обробник не викликається."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "POST":
+            return view(*args, **kwargs)
+        user = session.get("user")
+        key = str(user["id"]) if user else f"ip:{request.remote_addr}"
+        wait = buckets.take(key, request.endpoint)
+        if wait:
+            metrics.rate_limited.inc(request.endpoint)
+            retry = max(1, math.ceil(wait))
+            return f"⏳ Забагато запитів. Спробуйте через {retry} с.", 429, {"Retry-After": str(retry)}
+        resp = view(*args, **kwargs)
+        if g.pop("idempotent_replay", False):
+            buckets.refund(key, request.endpoint)
+        return resp
+
+    return wrapper
@@ -0,0 +1,243 @@
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import discord
+
+import db
+
+
+# ── Строки оренди транспорту ──────────────────────────────────────────────────
+# Тривалість з форми ("2 год", "1 год 30 хв", "1,5h", "2:30", "до 18:00")
+# перетворюється на due_at; нерозпізнаний ввід — RENTAL_DEFAULT_HOURS.
+# Планувальник на loop бота не сканує таблицю: часткові індекси по remind_at
+# і due_at дають найближчу подію за O(log n), тож він спить рівно до неї і
+# обробляє ті, що настали, пачками (нагадування власнику, позначка "прострочено").
+
+KYIV = ZoneInfo("Europe/Kyiv")
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"  # той самий формат, що й taken_at / returned_at
+
+RENTAL_DEFAULT_HOURS = float(os.getenv("RENTAL_DEFAULT_HOURS", 2))
+RENTAL_MAX_HOURS     = float(os.getenv("RENTAL_MAX_HOURS", 72))
+RENTAL_REMIND_MIN    = float(os.getenv("RENTAL_REMIND_MIN", 10))
+RENTAL_SWEEP_MAX_SEC = float(os.getenv("RENTAL_SWEEP_MAX_SEC", 30))
+RENTAL_BATCH         = int(os.getenv("RENTAL_BATCH", 200))
+RENTAL_UTIL_DAYS     = int(os.getenv("RENTAL_UTIL_DAYS", 7))
+
+# одиниці — лише цілими словами: "3 months" не стає "3 m" (хвилинами)
+_UNITS = {
+    **dict.fromkeys(("хв", "хвил", "хвилина", "хвилини", "хвилин", "m", "min", "mins", "minute", "minutes"), 60),
+    **dict.fromkeys(("г", "год", "година", "години", "годин", "h", "hr", "hrs", "hour", "hours"), 3600),
+    **dict.fromkeys(("д", "дн", "день", "дні", "днів", "доба", "доби", "діб", "d", "day", "days"), 86400),
+}
+_FILLER = {"і", "й", "та", "and"}  # "1 год і 30 хв"
+_PART_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*([^\W\d_]+)\.?")
+_CLOCK_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*$")
+_UNTIL_RE = re.compile(r"^\s*(?:до|until|till)\s+(\d{1,2})[:.](\d{2})\s*$")
+
+
+def now_kyiv() -> datetime:
+    return datetime.now(KYIV).replace(tzinfo=None)
+
+
+def due_label(ts: str) -> str:
+    # оренда може тривати до RENTAL_MAX_HOURS — без дати "до 01:30" читається як сьогодні
+    return f"{datetime.strptime(ts, TS_FORMAT):%d.%m %H:%M}"
+
+
+def parse_duration(text: str, taken_at: datetime):
+    """'2 год' / '1 год 30 хв' / '1,5h' / '2:30' / 'до 18:00' → timedelta або None (не розпізнано)."""
+    text = (text or "").strip().casefold()
+    m = _UNTIL_RE.match(text)
+    if m:
+        # час на годиннику — найближчий такий момент після взяття
+        hour, minute = int(m.group(1)), int(m.group(2))
+        if hour > 23 or minute > 59:
+            return None
+        due = taken_at.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if due <= taken_at:
+            due += timedelta(days=1)
+        return due - taken_at
+    m = _CLOCK_RE.match(text)
+    if m:
+        return timedelta(hours=int(m.group(1)), minutes=int(m.group(2))) or None
+
+    seconds = 0.0
+    for number, unit in _PART_RE.findall(text):
+        if unit not in _UNITS:
+            return None
+        seconds += float(number.replace(",", ".")) * _UNITS[unit]
+    # усе, що лишилось поза "число + одиниця" (зокрема число без одиниць), — не розпізнано
+    if any(word not in _FILLER for word in re.findall(r"\w+", _PART_RE.sub(" ", text))):
+        return None
+    return timedelta(seconds=seconds) if seconds > 0 else None
+
+
+def schedule(taken_at: datetime, duration: str):
+    """(due_at, remind_at) для нового бронювання; remind_at=None, якщо оренда коротша за нагадування."""
+    delta = parse_duration(duration, taken_at) or timedelta(hours=RENTAL_DEFAULT_HOURS)
+    delta = min(delta, timedelta(hours=RENTAL_MAX_HOURS))
+    due = taken_at + delta
+    remind = due - timedelta(minutes=RENTAL_REMIND_MIN)
+    return due.strftime(TS_FORMAT), (remind.strftime(TS_FORMAT) if remind > taken_at else None)
+
+
+def fleet_utilization(days: int = RENTAL_UTIL_DAYS) -> dict:
+    """{vehicle_id: годин в оренді} за останні days днів (відкриті оренди — до поточного моменту)."""
+    now = now_kyiv()
+    since = now - timedelta(days=days)
+    now_s, since_s = now.strftime(TS_FORMAT), since.strftime(TS_FORMAT)
+    with db.connect() as conn:
+        rows = conn.execute("""
+            SELECT vehicle_id,
+                   SUM(MAX(0, julianday(MIN(COALESCE(returned_at, :now), :now))
+                             - julianday(MAX(taken_at, :since)))) * 24
+            FROM (
+                SELECT vehicle_id, taken_at, returned_at FROM vehicle_rentals
+                WHERE returned_at >= :since
+                UNION ALL
+                SELECT vehicle_id, taken_at, returned_at FROM vehicle_rentals
+                WHERE returned_at IS NULL
+            )
+            GROUP BY vehicle_id
+        """, {"now": now_s, "since": since_s}).fetchall()
+    return {vid: hours or 0.0 for vid, hours in rows}
+
+
+class RentalScheduler:
+    def __init__(self, bot, outbox, channel_id: int, lease=None):
+        self.bot = bot
+        self.outbox = outbox
+        self.channel_id = channel_id
+        self.lease = lease
+        self._loop = None
+        self._wake = None
+        self._task = None
+
+    def kick(self):
+        # нове бронювання могло стати найближчою подією; в іншому процесі — спрацює RENTAL_SWEEP_MAX_SEC
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        try:
+            await asyncio.to_thread(self.backfill)
+        except Exception as e:
+            print(f"RENTALS: backfill не вдався: {e!r}", flush=True)
+        while True:
+            if self.lease is not None and not self.lease.held:
+                delay = RENTAL_SWEEP_MAX_SEC  # нагадування шле інший процес бота
+            else:
+                try:
+                    delay = await asyncio.to_thread(self.sweep)
+                except Exception as e:
+                    print(f"RENTALS: помилка планувальника: {e!r}", flush=True)
+                    delay = RENTAL_SWEEP_MAX_SEC
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    # ── Робота з БД (у потоці) ──
+    def backfill(self):
+        """Строки для відкритих оренд, створених до появи due_at."""
+        while True:
+            with db.connect() as conn:
+                rows = conn.execute("""
+                    SELECT id, taken_at, duration FROM vehicle_rentals
+                    WHERE returned_at IS NULL AND due_at IS NULL
+                    LIMIT ?
+                """, (RENTAL_BATCH,)).fetchall()
+                if not rows:
+                    return
+                conn.executemany(
+                    "UPDATE vehicle_rentals SET due_at=?, remind_at=? WHERE id=?",
+                    [(*schedule(datetime.strptime(taken, TS_FORMAT), duration), rid) for rid, taken, duration in rows],
+                )
+
+    def sweep(self) -> float:
+        """Обробляє події, що настали. Повертає, скільки секунд спати до наступної."""
+        now = now_kyiv().strftime(TS_FORMAT)
+        while self._flag_overdue(now) == RENTAL_BATCH:
+            pass
+        while self._remind(now) == RENTAL_BATCH:
+            pass
+
+        with db.connect() as conn:
+            next_due = conn.execute(
+                "SELECT MIN(due_at) FROM vehicle_rentals WHERE returned_at IS NULL AND overdue_at IS NULL"
+            ).fetchone()[0]
+            next_remind = conn.execute(
+                "SELECT MIN(remind_at) FROM vehicle_rentals WHERE returned_at IS NULL AND remind_at IS NOT NULL"
+            ).fetchone()[0]
+        upcoming = [t for t in (next_due, next_remind) if t]
+        if not upcoming:
+            return RENTAL_SWEEP_MAX_SEC
+        wait = (datetime.strptime(min(upcoming), TS_FORMAT) - now_kyiv()).total_seconds()
+        return min(max(wait, 1.0), RENTAL_SWEEP_MAX_SEC)
+
+    def _remind(self, now: str) -> int:
+        with db.connect() as conn:
+            rows = conn.execute("""
+                SELECT id, plate, model, taken_by_id, due_at FROM vehicle_rentals
+                WHERE returned_at IS NULL AND remind_at IS NOT NULL AND remind_at <= ?
+                ORDER BY remind_at
+                LIMIT ?
+            """, (now, RENTAL_BATCH)).fetchall()
+            conn.executemany("UPDATE vehicle_rentals SET remind_at=NULL WHERE id=?", [(r[0],) for r in rows])
+            for _, plate, model, user_id, due_at in rows:
+                embed = discord.Embed(
+                    title="⏰ Час оренди спливає",
+                    description=(
+                        "━━━━━━━━━━━━━━━━━━━\n"
+                        f"👤 **Хто взяв:** <@{user_id}>\n"
+                        f"🪪 **Номера:** `{plate}`\n"
+                        f"🚘 **Модель:** {model}\n"
+                        f"⌛ **Повернути до:** `{due_label(due_at)}`\n"
+                        "━━━━━━━━━━━━━━━━━━━"
+                    ),
+                    color=discord.Color.orange()
+                )
+                embed.set_footer(text="BCSD • Vehicle Reminder")
+                self.outbox.send(self.channel_id, embed, conn)
+        return len(rows)
+
+    def _flag_overdue(self, now: str) -> int:
+        with db.connect() as conn:
+            rows = conn.execute("""
+                SELECT id, plate, model, taken_by_id, due_at FROM vehicle_rentals
+                WHERE returned_at IS NULL AND overdue_at IS NULL AND due_at <= ?
+                ORDER BY due_at
+                LIMIT ?
+            """, (now, RENTAL_BATCH)).fetchall()
+            conn.executemany(
+                "UPDATE vehicle_rentals SET overdue_at=?, remind_at=NULL WHERE id=?",
+                [(now, r[0]) for r in rows],
+            )
+            for _, plate, model, user_id, due_at in rows:
+                embed = discord.Embed(
+                    title="🚨 Транспорт не повернуто вчасно",
+                    description=(
+                        "━━━━━━━━━━━━━━━━━━━\n"
+                        f"👤 **Хто взяв:** <@{user_id}>\n"
+                        f"🪪 **Номера:** `{plate}`\n"
+                        f"🚘 **Модель:** {model}\n"
+                        f"⌛ **Мав повернути до:** `{datetime.strptime(due_at, TS_FORMAT):%d.%m.%Y %H:%M}`\n"
+                        "━━━━━━━━━━━━━━━━━━━"
+                    ),
+                    color=discord.Color.red()
+                )
+                embed.set_footer(text="BCSD • Vehicle Overdue")
+                self.outbox.send(self.channel_id, embed, conn)
+        return len(rows)
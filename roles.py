@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+
+
+# ── Ролі гільдії та рішення про доступ ────────────────────────────────────────
+# Карта id → назва і множина id дозволених ролей будуються один раз із гільдії та
+# оновлюються з подій ролей; перевірка доступу — перетин множин, а рішення по
+# користувачу кешується на ACCESS_CACHE_TTL секунд.
+
+ACCESS_CACHE_TTL = float(os.getenv("ACCESS_CACHE_TTL", 60))
+ACCESS_CACHE_MAX = int(os.getenv("ACCESS_CACHE_MAX", 10000))
+
+
+class RoleIndex:
+    def __init__(self, guild_id: int, allowed_names):
+        self.guild_id = guild_id
+        self.allowed_names = set(allowed_names)
+        self._lock = threading.Lock()
+        self._names = {}            # role id -> name
+        self._allowed_ids = frozenset()
+        self._decisions = {}        # user id -> (expires_at, bool)
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._names)
+
+    # ── Запис (loop бота) ──
+    def load(self, guild):
+        with self._lock:
+            self._names = {r.id: r.name for r in guild.roles}
+            self._rebuild()
+
+    def upsert(self, role):
+        if role.guild.id != self.guild_id:
+            return
+        with self._lock:
+            self._names[role.id] = role.name
+            self._rebuild()
+
+    def remove(self, role):
+        if role.guild.id != self.guild_id:
+            return
+        with self._lock:
+            self._names.pop(role.id, None)
+            self._rebuild()
+
+    def forget(self, user_id):
+        # ролі користувача змінились — наступна перевірка рахується заново
+        self._decisions.pop(str(user_id), None)
+
+    def _rebuild(self):
+        self._allowed_ids = frozenset(rid for rid, name in self._names.items() if name in self.allowed_names)
+        self._decisions = {}
+
+    # ── Читання (Flask) ──
+    def name_of(self, role_id):
+        return self._names.get(int(role_id))
+
+    def has_access(self, user_id, role_ids) -> bool:
+        """Чи має користувач хоч одну з дозволених ролей (role_ids — id з Discord API)."""
+        user_id = str(user_id)
+        now = time.monotonic()
+        cached = self._decisions.get(user_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        allowed = not self._allowed_ids.isdisjoint(int(r) for r in role_ids)
+
+        if len(self._decisions) >= ACCESS_CACHE_MAX:
+            self._decisions = {k: v for k, v in self._decisions.items() if v[0] > now}
+            if len(self._decisions) >= ACCESS_CACHE_MAX:
+                self._decisions = {}
+        self._decisions[user_id] = (now + ACCESS_CACHE_TTL, allowed)
+        return allowed
@@ -0,0 +1,206 @@
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+import db
+
+
+# ── Серверні сесії ────────────────────────────────────────────────────────────
+# У cookie — лише випадковий непрозорий id; сама сесія (профіль Discord, ролі)
+# лежить в окремому файлі sessions.db — НЕ в audit.db, який можна вивантажити
+# (/download_db): id живих сесій у знімку дорівнювали б викраденим cookie. Кожен процес тримає LRU-кеш прочитаних
+# сесій на SESSION_CACHE_SEC: звичайний запит — пошук у словнику, без розбору
+# і перевірки підпису cookie. Статика сесію не відкриває взагалі. Вихід видаляє
+# рядок (інші процеси забувають сесію щонайпізніше за SESSION_CACHE_SEC),
+# прострочені сесії видаляються пачкою раз на SESSION_PRUNE_SEC.
+
+SESSION_TTL_HOURS   = float(os.getenv("SESSION_TTL_HOURS", 24 * 7))
+SESSION_REFRESH_SEC = float(os.getenv("SESSION_REFRESH_SEC", 3600))  # як часто продовжувати строк у БД
+SESSION_CACHE_SEC   = float(os.getenv("SESSION_CACHE_SEC", 30))
+SESSION_CACHE_MAX   = int(os.getenv("SESSION_CACHE_MAX", 10000))
+SESSION_PRUNE_SEC   = 3600
+
+# за замовчуванням — поруч з audit.db
+SESSIONS_DB_PATH = os.getenv(
+    "SESSIONS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(db.DB_PATH)), "sessions.db")
+)
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS sessions (
+           id         TEXT PRIMARY KEY,
+           user_id    TEXT NOT NULL,
+           data       TEXT NOT NULL,
+           created_at REAL NOT NULL,
+           expires_at REAL NOT NULL
+       ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)",
+)
+
+_local = threading.local()
+
+
+def _connect():
+    # з'єднання на потік; після fork (воркери gunicorn) — нове
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = db.open_file(SESSIONS_DB_PATH)
+        for sql in _SCHEMA:
+            conn.execute(sql)
+        conn.commit()
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires_at=0.0):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.modified = False
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, static_url_path: str):
+        self.static_prefix = static_url_path.rstrip("/") + "/"
+        self._cache = OrderedDict()  # sid -> (кешовано до, дані, expires_at)
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    # ── Кеш процесу ──
+    def _cached(self, sid: str):
+        with self._lock:
+            entry = self._cache.get(sid)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._cache[sid]
+                return None
+            self._cache.move_to_end(sid)
+            return entry
+
+    def _remember(self, sid: str, data: dict, expires_at: float):
+        with self._lock:
+            self._cache[sid] = (time.monotonic() + SESSION_CACHE_SEC, data, expires_at)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > SESSION_CACHE_MAX:
+                self._cache.popitem(last=False)
+
+    def _drop(self, sid: str):
+        with self._lock:
+            self._cache.pop(sid, None)
+
+    # ── Сховище ──
+    def _load(self, sid: str):
+        entry = self._cached(sid)
+        if entry is not None:
+            return entry[1], entry[2]
+        with _connect() as conn:
+            row = conn.execute(
+                "SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?", (sid, time.time())
+            ).fetchone()
+        if row is None:
+            return None, 0.0
+        data = json.loads(row[0])
+        self._remember(sid, data, row[1])
+        return data, row[1]
+
+    def _prune(self):
+        now = time.monotonic()
+        if now - self._pruned_at < SESSION_PRUNE_SEC:
+            return
+        self._pruned_at = now
+        with _connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+    def revoke_user(self, user_id):
+        """Завершує всі сесії користувача (в інших процесах — за SESSION_CACHE_SEC)."""
+        with _connect() as conn:
+            sids = [r[0] for r in conn.execute(
+                "DELETE FROM sessions WHERE user_id = ? RETURNING id", (str(user_id),)
+            ).fetchall()]
+        for sid in sids:
+            self._drop(sid)
+        return len(sids)
+
+    def set_roles(self, user_id, roles):
+        """Оновлює кешовані в сесіях користувача назви ролей (після зміни ролей у гільдії)."""
+        with _connect() as conn:
+            sids = [r[0] for r in conn.execute(
+                "UPDATE sessions SET data = json_set(data, '$.roles', json(?)) WHERE user_id = ? RETURNING id",
+                (json.dumps(list(roles), ensure_ascii=False), str(user_id)),
+            ).fetchall()]
+        for sid in sids:
+            self._drop(sid)
+
+    # ── Flask ──
+    def open_session(self, app, request):
+        if request.path.startswith(self.static_prefix):
+            return self.make_null_session(app)  # фони/скрипти: без пошуку сесії
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data, expires_at = self._load(sid)
+            if data is not None:
+                return ServerSession(dict(data), sid, expires_at)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        if not isinstance(session, ServerSession):
+            return
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid:
+                # вихід (session.clear()) — сесію видаляємо й на сервері
+                with _connect() as conn:
+                    conn.execute("DELETE FROM sessions WHERE id = ?", (session.sid,))
+                self._drop(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        ttl = SESSION_TTL_HOURS * 3600
+        refresh = now + ttl - session.expires_at > SESSION_REFRESH_SEC
+        if not (session.modified or refresh):
+            return
+
+        if session.modified and session.sid:
+            # новий вміст (вхід) — новий id: старий cookie не переживе зміну користувача
+            with _connect() as conn:
+                conn.execute("DELETE FROM sessions WHERE id = ?", (session.sid,))
+            self._drop(session.sid)
+            session.sid = None
+
+        expires_at = now + ttl
+        data = dict(session)
+        with _connect() as conn:
+            if session.sid:
+                conn.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (expires_at, session.sid))
+            else:
+                session.sid = secrets.token_urlsafe(24)
+                conn.execute(
+                    "INSERT INTO sessions (id, user_id, data, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (session.sid, str((data.get("user") or {}).get("id", "")),
+                     json.dumps(data, ensure_ascii=False), now, expires_at),
+                )
+        self._remember(session.sid, data, expires_at)
+        self._prune()
+
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
@@ -0,0 +1,102 @@
+import os
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import db
+
+
+# ── Статистика активності ─────────────────────────────────────────────────────
+# Усе читається зі зведень, які тригери оновлюють при кожному записі
+# (migrations.py v13): activity_daily — день × вид × ключ (тип дії / авто),
+# activity_member_daily — день × вид × учасник, activity_totals — за весь час.
+# Період у N днів читає лише N днів зведень; "весь час" — лише activity_totals.
+
+KYIV = ZoneInfo("Europe/Kyiv")
+
+STATS_PERIODS    = (7, 30, 90, 0)  # 0 — за весь час
+STATS_TOP        = int(os.getenv("STATS_TOP", 10))
+STATS_DAILY_DAYS = 90              # таблиця "по днях" — не довша за стільки днів
+
+KINDS = {
+    "action": "Кадрові дії",
+    "exam":   "Запити на іспити",
+    "craft":  "Крафт-звіти",
+    "rental": "Оренди транспорту",
+}
+
+
+def since_day(days: int) -> str:
+    if not days:
+        return ""
+    return (datetime.now(KYIV) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+
+def overview(days: int) -> dict:
+    since = since_day(days)
+    with db.connect() as conn:
+        def top(kind: str, by: str, order: str):
+            # by: "key" (тип дії / авто) або "member"; рядки — (підпис, к-сть, величина)
+            if not days:
+                sql, params = f"""
+                    SELECT COALESCE(label, value), events, amount FROM activity_totals
+                    WHERE kind = ? AND dim = ? AND events > 0
+                    ORDER BY {order} DESC LIMIT ?
+                """, (kind, by, STATS_TOP)
+            elif by == "member":
+                sql, params = f"""
+                    SELECT MAX(member_name), SUM(events) AS events, SUM(amount) AS amount
+                    FROM activity_member_daily
+                    WHERE day >= ? AND kind = ?
+                    GROUP BY member HAVING SUM(events) > 0
+                    ORDER BY {order} DESC LIMIT ?
+                """, (since, kind, STATS_TOP)
+            else:
+                sql, params = f"""
+                    SELECT key, SUM(events) AS events, SUM(amount) AS amount
+                    FROM activity_daily
+                    WHERE day >= ? AND kind = ?
+                    GROUP BY key HAVING SUM(events) > 0
+                    ORDER BY {order} DESC LIMIT ?
+                """, (since, kind, STATS_TOP)
+            return conn.execute(sql, params).fetchall()
+
+        totals = {kind: (0, 0.0) for kind in KINDS}
+        if days:
+            rows = conn.execute("""
+                SELECT kind, SUM(events), SUM(amount) FROM activity_daily
+                WHERE day >= ? GROUP BY kind
+            """, (since,))
+        else:
+            rows = conn.execute("""
+                SELECT kind, SUM(events), SUM(amount) FROM activity_totals
+                WHERE dim = 'key' GROUP BY kind
+            """)
+        for kind, events, amount in rows:
+            totals[kind] = (events, amount)
+
+        daily = conn.execute("""
+            SELECT day,
+                   SUM(CASE WHEN kind = 'action' THEN events END),
+                   SUM(CASE WHEN kind = 'exam'   THEN events END),
+                   SUM(CASE WHEN kind = 'craft'  THEN events END),
+                   SUM(CASE WHEN kind = 'craft'  THEN amount END),
+                   SUM(CASE WHEN kind = 'rental' THEN events END),
+                   SUM(CASE WHEN kind = 'rental' THEN amount END)
+            FROM activity_daily
+            WHERE day >= ?
+            GROUP BY day
+            ORDER BY day DESC
+        """, (max(since, since_day(STATS_DAILY_DAYS)),)).fetchall()
+
+        return {
+            "days": days,
+            "totals": totals,
+            "daily": daily,
+            "actions_by_type": top("action", "key", "events"),
+            "actions_by_member": top("action", "member", "events"),
+            "exams_by_type": top("exam", "key", "events"),
+            "exams_by_member": top("exam", "member", "events"),
+            "craft_by_member": top("craft", "member", "amount"),
+            "rental_by_vehicle": top("rental", "key", "amount"),
+            "rental_by_member": top("rental", "member", "amount"),
+        }